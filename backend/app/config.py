@@ -41,11 +41,84 @@ class Settings(BaseSettings):
     # Files
     upload_dir: str = "/tmp/uploads" # /tmp est mieux pour le cloud
     max_audio_size_mb: int = 100
+    # Uploads jusqu'à cette taille décodés directement en mémoire (sans fichier)
+    upload_memory_max_mb: int = 16
+    # Rééchantillonnage vers 22050 Hz : soxr_vhq | soxr_hq | soxr_mq | soxr_lq | soxr_qq
+    # (ignoré si l'audio est déjà à 22050 Hz)
+    resample_quality: str = "soxr_hq"
     
     # Emotion Model
     emotion_model_type: str = "local"
     emotion_model_path: str = "./models/emotion_model.onnx"
     emotion_model_name: str = "superb/wav2vec2-base-superb-er"
+    # Quantification post-entraînement : none | float16 (tflite) | int8 (tflite / onnx)
+    emotion_model_quantization: str = "none"
+    # Un modèle quantifié est refusé sous ce taux d'accord top-1 avec le modèle flottant
+    emotion_quantized_min_agreement: float = 0.95
+    emotion_calibration_features: str = "./models/calibration_features.npy"
+
+    # Analyse par fenêtres glissantes (en trames de features, 1 trame = 512 échantillons)
+    analysis_window_frames: int = 300  # ~7 s à 22050 Hz, taille d'entrée du modèle
+    analysis_hop_frames: int = 150
+
+    # Micro-batching de l'inférence (partagé par toutes les requêtes)
+    inference_max_batch_size: int = 64  # fenêtres par appel au modèle
+    inference_max_wait_ms: float = 10.0
+    inference_queue_depth: int = 256
+
+    # Inférence temps réel : features incrémentales par appel, un predict groupé par tick
+    realtime_tick_ms: float = 500.0
+    realtime_min_audio_s: float = 1.0  # audio minimal avant la première prédiction
+    realtime_min_new_audio_s: float = 1.0  # audio nouveau minimal entre deux prédictions
+    realtime_idle_s: float = 60.0  # flux libéré sans audio reçu pendant ce délai
+    realtime_history_size: int = 600  # émotions gardées par appel actif (~30 min à 3 s)
+
+    # Envois WebSocket : file sortante bornée et tâche d'envoi par connexion
+    ws_outbox_size: int = 256  # messages en attente avant abandon / éviction
+    ws_send_timeout_s: float = 5.0  # envoi plus lent : connexion évincée
+    # Mises à jour d'émotion superviseurs : un message groupé par équipe et par tick
+    ws_publish_tick_ms: float = 250.0
+    ws_call_min_interval_ms: float = 1000.0  # délai minimal entre deux publications d'un appel
+
+    # Cache des résultats d'analyse (clé = hash audio + modèle + pipeline)
+    result_cache_memory_mb: int = 64
+    result_cache_dir: str = ""  # vide = pas de niveau disque
+    result_cache_disk_mb: int = 1024
+
+    # Stockage persistant des features normalisées (.npy mappés), vide = désactivé
+    feature_store_dir: str = ""
+
+    # Détection de parole (énergie + ZCR) : seules les zones de parole sont analysées
+    vad_enabled: bool = True
+    vad_energy_margin_db: float = 15.0  # au-dessus du plancher de bruit
+    vad_min_energy_db: float = -55.0  # dBFS, en dessous : toujours du silence
+    vad_max_zcr: float = 0.4  # au-dessus : bruit large bande (souffle)
+    vad_min_speech_ms: float = 250.0
+    vad_hangover_ms: float = 300.0  # marge conservée autour de chaque zone
+
+    # Débruitage (gating spectral sur le spectrogramme des features)
+    # ignoré si le SNR estimé est au-dessus du seuil
+    denoise_snr_threshold_db: float = 20.0
+    denoise_prop_decrease: float = 0.8
+
+    # Analyse par lot (/api/analyze/batch : fichiers multiples ou archives zip)
+    batch_max_size_mb: int = 2048  # corps complet de la requête
+    batch_max_files: int = 1000
+    batch_concurrency: int = 0  # fichiers analysés en parallèle, 0 = nombre de CPU
+
+    # Pool de processus DSP (décodage / débruitage / features)
+    # 0 = exécution dans le pool de threads par défaut du processus principal
+    dsp_workers: int = 0
+
+    # Contrôle d'admission de l'analyse synchrone (/api/analyze/upload)
+    admission_max_concurrent: int = 0  # analyses simultanées, 0 = nombre de CPU
+    admission_max_queue: int = 16  # requêtes en attente au-delà : 429 + Retry-After
+
+    # File de jobs d'analyse asynchrones (SQLite + audio sur disque)
+    job_store_dir: str = "/tmp/auravoice_jobs"
+    job_workers: int = 2
+    job_default_rtf: float = 0.1  # temps de traitement / durée audio, avant les premières mesures
+    job_retention_hours: int = 24  # jobs terminés conservés
     
     @property
     def postgres_url(self) -> str:
@@ -7,6 +7,14 @@ from app.config import settings
 from app.database import init_database, close_database
 from app.routers import auth, calls, websocket, analysis
 from app.services.emotion_ai_service import emotion_service
+from app.services.result_cache import result_cache
+from app.services.pipeline_stats import pipeline_stats
+from app.services.job_queue import job_queue
+from app.services.admission import admission
+from app.services.realtime_inference import realtime_inference
+from app.services.realtime_service import manager, publish_realtime_emotion
+from app.services.team_publisher import team_publisher
+from app.services.ws_outbox import outbox_stats
 
 
 @asynccontextmanager
@@ -23,6 +31,15 @@ async def lifespan(app: FastAPI):
     
     # Initialiser le service d'IA
     await emotion_service.initialize()
+
+    # Inférence temps réel groupée (un predict par tick pour tous les appels)
+    await realtime_inference.start(publish_realtime_emotion)
+
+    # Publication groupée des mises à jour d'émotion aux superviseurs
+    await team_publisher.start(manager.publish_to_team)
+
+    # Workers de la file de jobs (reprise des jobs en attente)
+    await job_queue.start()
     
     print("AuraVoice Backend ready!")
     
@@ -30,6 +47,10 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     print("Shutting down AuraVoice Backend...")
+    await job_queue.stop()
+    await realtime_inference.stop()
+    await team_publisher.stop()
+    await emotion_service.shutdown()
     await close_database()
 
 
@@ -76,6 +97,19 @@ async def health():
     return {"status": "healthy"}
 
 
+@app.get("/metrics")
+async def metrics():
+    return {
+        "result_cache": result_cache.stats(),
+        "dsp_pipeline": pipeline_stats.stats(),
+        "jobs": job_queue.stats(),
+        "admission": admission.stats(),
+        "realtime": realtime_inference.stats(),
+        "websocket": outbox_stats.stats(),
+        "team_publisher": team_publisher.stats(),
+    }
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -97,7 +97,7 @@ class ActiveCall(BaseModel):
     current_emotion: EmotionData
     emotion_history: List[EmotionData]
     alert_triggered: bool
-    alert_duration: int  # seconds
+    alert_duration: float  # seconds
 
 class CallStats(BaseModel):
     anger_percentage: float
@@ -146,5 +146,5 @@ class ReportFilters(BaseModel):
 # ============================================
 
 class WebSocketMessage(BaseModel):
-    type: str  # "emotion_update", "alert", "call_started", "call_ended"
+    type: str  # "emotion_updates", "alert", "call_started", "call_ended"
     data: dict
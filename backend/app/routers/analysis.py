@@ -1,34 +1,100 @@
-import os
-import shutil
-from fastapi import APIRouter, UploadFile, File, HTTPException
+import json
+from typing import Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from app.config import settings
 from app.services.emotion_ai_service import emotion_service
+from app.services.audio_decoder import g711_encoding_for
+from app.services.batch_analysis import BatchAnalysis, BATCH_UPLOAD_OPENAPI
+from app.services.job_queue import job_queue
+from app.services.admission import admission
+from app.services.upload_ingest import (
+    receive_upload, check_multipart, check_content_length, UPLOAD_OPENAPI,
+)
 
 router = APIRouter()
 
-@router.post("/api/analyze/upload")
-async def analyze_audio_endpoint(file: UploadFile = File(...)):
-    # 1. Dossier temporaire
-    temp_dir = "temp_uploads"
-    os.makedirs(temp_dir, exist_ok=True)
-    temp_file_path = os.path.join(temp_dir, file.filename)
-    
+@router.post("/api/analyze/upload", openapi_extra=UPLOAD_OPENAPI)
+async def analyze_audio_endpoint(request: Request, encoding: Optional[Literal["mulaw", "alaw"]] = None):
+    # Serveur saturé : refus avant de lire le corps
+    admission.check()
+
+    # 1. Réception en streaming (taille max, sha256, mémoire ou fichier de spool unique)
+    upload = await receive_upload(request)
+
     try:
-        # 2. Sauvegarde
-        with open(temp_file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-            
-        # 3. Analyse
-        result = await emotion_service.analyze_audio_file(temp_file_path)
+        # 2. Analyse (ou résultat en cache pour un contenu identique)
+        # G.711 brut (PBX) : encodage explicite ou déduit de l'extension (.ul / .al)
+        encoding = encoding or g711_encoding_for(upload.filename)
+        async with admission.admit():
+            result = await emotion_service.analyze_audio_file(upload.source, audio_hash=upload.sha256, encoding=encoding)
         return result
 
+    except HTTPException:
+        raise
+
     except Exception as e:
         print(f"Erreur endpoint: {e}")
         raise HTTPException(status_code=500, detail="Erreur interne lors de l'analyse")
-        
+
     finally:
-        # 4. Nettoyage
-        if os.path.exists(temp_file_path):
-            try:
-                os.remove(temp_file_path)
-            except:
-                pass
\ No newline at end of file
+        # 3. Nettoyage
+        await upload.cleanup()
+
+
+@router.post("/api/analyze/batch", openapi_extra=BATCH_UPLOAD_OPENAPI)
+async def analyze_batch_endpoint(request: Request, format: Literal["ndjson", "json"] = "ndjson"):
+    """
+    Analyse d'un lot de fichiers (plusieurs fichiers et/ou archives zip).
+    - ndjson (défaut) : une ligne {"filename", "result"} par fichier, envoyée dès
+      que son analyse est terminée (une fois le corps reçu)
+    - json : un objet {nom de fichier: résultat} une fois tout le lot traité
+    """
+    check_multipart(request)
+    check_content_length(request, settings.batch_max_size_mb * 1024 * 1024)
+    admission.check()
+
+    # Corps lu entièrement ici (analyses lancées au fil de la réception)
+    batch = BatchAnalysis()
+    await batch.receive(request)
+
+    if format == "json":
+        results = {}
+        async for filename, result in batch.results():
+            key, n = filename, 1
+            while key in results:  # même nom dans plusieurs archives
+                n += 1
+                key = f"{filename} ({n})"
+            results[key] = result
+        return results
+
+    async def lines():
+        async for filename, result in batch.results():
+            yield json.dumps({"filename": filename, "result": result}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.post("/api/analyze/jobs", status_code=202, openapi_extra=UPLOAD_OPENAPI)
+async def submit_analysis_job(request: Request, encoding: Optional[Literal["mulaw", "alaw"]] = None):
+    """
+    Analyse asynchrone : l'audio est mis en file et l'id du job retourné
+    immédiatement, avec une estimation du délai (eta_seconds) selon la durée
+    audio et la file d'attente. Suivi via GET /api/analyze/jobs/{job_id}
+    ou le WebSocket /ws/jobs/{job_id}.
+    """
+    upload = await receive_upload(request)
+    try:
+        encoding = encoding or g711_encoding_for(upload.filename)
+        return await job_queue.submit(upload, encoding)
+    finally:
+        await upload.cleanup()
+
+
+@router.get("/api/analyze/jobs/{job_id}")
+async def get_analysis_job(job_id: str):
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job introuvable")
+    return job
@@ -1,9 +1,15 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
 from typing import Optional
+import asyncio
+import base64
+import binascii
 import json
 
 from app.services.realtime_service import manager, process_realtime_audio
 from app.services.auth_service import decode_token
+from app.services.job_queue import job_queue
+from app.services.audio_protocol import AgentAudioSession, ProtocolError
+from app.services.audio_decoder import AudioDecodeError
 
 router = APIRouter(tags=["WebSocket"])
 
@@ -27,16 +33,10 @@ async def supervisor_websocket(
         await websocket.close(code=4001, reason="Token invalide")
         return
     
-    await manager.connect_supervisor(websocket, team_id)
+    # L'état initial des appels actifs est le premier message de la file
+    outbox = await manager.connect_supervisor(websocket, team_id)
     
     try:
-        # Envoyer l'état initial des appels actifs
-        active_calls = manager.get_active_calls_for_team(team_id)
-        await websocket.send_json({
-            "type": "initial_state",
-            "data": {"calls": active_calls}
-        })
-        
         while True:
             # Garder la connexion ouverte et traiter les messages
             data = await websocket.receive_text()
@@ -44,7 +44,7 @@ async def supervisor_websocket(
             
             # Traiter les commandes du superviseur si nécessaire
             if message.get("type") == "ping":
-                await websocket.send_json({"type": "pong"})
+                outbox.put(json.dumps({"type": "pong"}))
     
     except WebSocketDisconnect:
         manager.disconnect_supervisor(websocket, team_id)
@@ -67,44 +67,92 @@ async def agent_websocket(
         await websocket.close(code=4001, reason="Token invalide")
         return
     
-    await manager.connect_agent(websocket, agent_id)
+    session = AgentAudioSession()
+    # Tous les envois passent par la file sortante de la connexion
+    outbox = await manager.connect_agent(websocket, agent_id, session)
     
     try:
         while True:
-            # Recevoir les données audio en binaire
             data = await websocket.receive()
+            if data["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(data.get("code", 1000))
             
-            if "bytes" in data:
-                # Données audio binaires
-                audio_bytes = data["bytes"]
+            if data.get("bytes") is not None:
+                # Trame binaire : en-tête fixe (audio_protocol.HEADER) + PCM / G.711 brut
+                try:
+                    call_id, timestamp, samples = session.decode(data["bytes"])
+                except ProtocolError as e:
+                    outbox.put(json.dumps({"type": "error", "code": "protocol_error", "message": str(e)}))
+                    continue
                 
-                # Extraire le call_id et timestamp du header (premiers 16 bytes)
-                # Format: call_id (8 bytes) + timestamp (8 bytes float) + audio
-                # Pour simplifier, on peut aussi envoyer en JSON avec base64
+                await process_realtime_audio(call_id, samples, timestamp)
                 
-                # Traiter l'audio
-                # await process_realtime_audio(call_id, audio_bytes, timestamp)
-                pass
-                
-            elif "text" in data:
+            elif data.get("text") is not None:
                 message = json.loads(data["text"])
                 
-                if message.get("type") == "audio_chunk":
-                    import base64
-                    call_id = message["call_id"]
+                if message.get("type") == "hello":
+                    # Négociation de la version du protocole binaire
+                    try:
+                        outbox.put(json.dumps(session.hello(message.get("protocol_versions", []))))
+                    except ProtocolError as e:
+                        outbox.put(json.dumps({"type": "error", "code": "unsupported_protocol", "message": str(e)}))
+                
+                elif message.get("type") == "audio_chunk":
+                    # Ancien format JSON (audio en base64), toujours accepté
+                    # Sans call_id : appel actif de l'agent (index par agent)
+                    call_id = message.get("call_id")
+                    if call_id is None:
+                        call = manager.get_call_for_agent(agent_id)
+                        if call is None:
+                            outbox.put(json.dumps({"type": "error", "code": "no_active_call",
+                                                   "message": "Aucun appel actif pour cet agent"}))
+                            continue
+                        call_id = call.id
                     timestamp = message["timestamp"]
-                    audio_data = base64.b64decode(message["audio"])
-                    
-                    emotion = await process_realtime_audio(call_id, audio_data, timestamp)
-                    
-                    # Renvoyer le feedback à l'agent
-                    await websocket.send_json({
-                        "type": "emotion_feedback",
-                        "data": emotion.model_dump()
-                    })
+
+                    # Feedback (emotion_feedback) envoyé au prochain tick d'inférence
+                    try:
+                        audio_data = base64.b64decode(message["audio"])
+                        await process_realtime_audio(call_id, audio_data, timestamp)
+                    except (binascii.Error, AudioDecodeError) as e:
+                        # Chunk illisible : signalé sans fermer la connexion
+                        outbox.put(json.dumps({"type": "error", "code": "decode_error", "message": str(e)}))
                 
                 elif message.get("type") == "ping":
-                    await websocket.send_json({"type": "pong"})
+                    outbox.put(json.dumps({"type": "pong"}))
     
     except WebSocketDisconnect:
-        manager.disconnect_agent(agent_id)
+        manager.disconnect_agent(agent_id, websocket)
+
+
+async def _until_disconnect(websocket: WebSocket):
+    """Ignore les messages du client jusqu'à sa déconnexion"""
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+@router.websocket("/ws/jobs/{job_id}")
+async def job_websocket(websocket: WebSocket, job_id: str):
+    """
+    Suivi d'un job d'analyse : envoie l'état courant (job_status), puis
+    job_completed avec le résultat dès la fin du job, et ferme la connexion.
+    """
+    await websocket.accept()
+    job = await job_queue.get(job_id)
+    if job is None:
+        await websocket.close(code=4004, reason="Job introuvable")
+        return
+
+    await websocket.send_json({"type": "job_status", "data": job})
+    if job["status"] in ("queued", "running"):
+        waiter = asyncio.create_task(job_queue.wait(job_id))
+        disconnect = asyncio.create_task(_until_disconnect(websocket))
+        await asyncio.wait({waiter, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        if not waiter.done():
+            waiter.cancel()
+            return
+        disconnect.cancel()
+        job = waiter.result()
+
+    await websocket.send_json({"type": "job_completed", "data": job})
+    await websocket.close()
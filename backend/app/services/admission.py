@@ -0,0 +1,95 @@
+import asyncio
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException, status
+
+from app.config import settings
+
+
+class AdmissionController:
+    """
+    Contrôle d'admission des analyses synchrones (uploads et fichiers des
+    lots) : au plus max_concurrent analyses en cours et max_queue requêtes
+    en attente d'une place. Au-delà, 429 avec Retry-After estimé à partir du temps de service
+    mesuré (moyenne glissante).
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, default_service_s: float = 2.0):
+        self.max_concurrent = max_concurrent or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.slots = asyncio.Semaphore(self.max_concurrent)
+
+        self.in_flight = 0
+        self.waiting = 0
+        self.service_s = default_service_s  # moyenne glissante du temps d'analyse
+
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_total_s = 0.0
+        self.wait_max_s = 0.0
+
+    def retry_after(self) -> int:
+        """Secondes avant qu'une place se libère dans la file, arrondi au supérieur"""
+        return max(1, math.ceil((self.waiting + 1) / self.max_concurrent * self.service_s))
+
+    def check(self):
+        """Rejette (429) si toutes les places et la file d'attente sont occupées"""
+        if self.in_flight + self.waiting >= self.max_concurrent + self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Serveur saturé, réessayez plus tard (ou utilisez /api/analyze/jobs)",
+                headers={"Retry-After": str(self.retry_after())},
+            )
+
+    @asynccontextmanager
+    async def admit(self, reject: bool = True):
+        """
+        Place d'analyse : attend dans la file bornée, ou 429 si elle est pleine.
+        reject=False : attend toujours (fichier d'un lot déjà accepté, dont la
+        concurrence propre borne l'attente).
+        """
+        if reject:
+            self.check()
+        self.waiting += 1
+        start = time.perf_counter()
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+        waited = time.perf_counter() - start
+        self.admitted += 1
+        self.wait_total_s += waited
+        self.wait_max_s = max(self.wait_max_s, waited)
+
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.slots.release()
+            self.service_s = 0.8 * self.service_s + 0.2 * (time.perf_counter() - start)
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "mean_wait_ms": round(self.wait_total_s / self.admitted * 1000, 1) if self.admitted else 0.0,
+            "max_wait_ms": round(self.wait_max_s * 1000, 1),
+            "service_ms": round(self.service_s * 1000, 1),
+        }
+
+
+# Instance globale
+admission = AdmissionController(
+    max_concurrent=settings.admission_max_concurrent,
+    max_queue=settings.admission_max_queue,
+)
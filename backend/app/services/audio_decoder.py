@@ -0,0 +1,274 @@
+"""
+Décodage audio en mémoire (chemin ou octets) vers un signal mono float32.
+
+Benchmark décodage + rééchantillonnage par minute d'audio, pour chaque qualité :
+    python -m app.services.audio_decoder bench
+"""
+import argparse
+import io
+import os
+import struct
+import subprocess
+import time
+
+import numpy as np
+import soundfile as sf
+import soxr
+
+from app.config import settings
+from app.services.feature_engine import SAMPLE_RATE
+
+
+class AudioDecodeError(ValueError):
+    """Le contenu ne peut être décodé ni par soundfile ni par ffmpeg"""
+
+
+# Qualités de rééchantillonnage (mêmes noms que res_type de librosa)
+RESAMPLE_QUALITIES = {
+    "soxr_vhq": "VHQ",
+    "soxr_hq": "HQ",  # défaut de librosa.load
+    "soxr_mq": "MQ",
+    "soxr_lq": "LQ",
+    "soxr_qq": "QQ",  # le plus rapide
+}
+
+# ============================================
+# G.711 (PBX) : tables de décodage précalculées
+# ============================================
+
+TELEPHONY_SAMPLE_RATE = 8000
+G711_ENCODINGS = ("mulaw", "alaw")
+# Extensions des fichiers G.711 bruts (sans en-tête)
+G711_EXTENSIONS = {
+    ".ul": "mulaw", ".ulaw": "mulaw", ".mulaw": "mulaw", ".pcmu": "mulaw",
+    ".al": "alaw", ".alaw": "alaw", ".pcma": "alaw",
+}
+# Tags de format WAVE (fmt chunk)
+_WAVE_FORMAT_ALAW = 6
+_WAVE_FORMAT_MULAW = 7
+
+
+def _mulaw_table() -> np.ndarray:
+    code = ~np.arange(256, dtype=np.uint8)
+    exponent = (code >> 4) & 0x07
+    mantissa = (code & 0x0F).astype(np.int32)
+    magnitude = (((mantissa << 3) + 0x84) << exponent) - 0x84
+    sample = np.where(code & 0x80, -magnitude, magnitude)
+    return (sample / 32768.0).astype(np.float32)
+
+
+def _alaw_table() -> np.ndarray:
+    code = np.arange(256, dtype=np.uint8) ^ 0x55
+    exponent = ((code >> 4) & 0x07).astype(np.int32)
+    mantissa = (code & 0x0F).astype(np.int32)
+    magnitude = (mantissa << 4) + 8
+    magnitude = np.where(exponent > 0, (magnitude + 0x100) << np.maximum(exponent - 1, 0), magnitude)
+    sample = np.where(code & 0x80, magnitude, -magnitude)
+    return (sample / 32768.0).astype(np.float32)
+
+
+# 256 valeurs chacune : décodage = une indexation numpy par octet
+G711_TABLES = {"mulaw": _mulaw_table(), "alaw": _alaw_table()}
+
+
+def decode_g711(payload, encoding: str) -> np.ndarray:
+    """Octets G.711 bruts -> float32 (mono, même échelle que soundfile)"""
+    if encoding not in G711_TABLES:
+        raise AudioDecodeError(f"Encodage G.711 inconnu : {encoding}")
+    return G711_TABLES[encoding][np.frombuffer(payload, dtype=np.uint8)]
+
+
+def g711_encoding_for(filename: str):
+    """Encodage déduit de l'extension d'un fichier brut (.ul, .al...), sinon None"""
+    if not filename:
+        return None
+    dot = filename.rfind(".")
+    return G711_EXTENSIONS.get(filename[dot:].lower()) if dot >= 0 else None
+
+
+def _read_g711_wav(data):
+    """
+    WAV G.711 (format 6 / 7, cas des enregistrements PBX) : lecture directe du
+    chunk data avec la table. Retourne None pour tout autre WAV.
+    """
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        return None
+    view = memoryview(data)
+    pos, encoding, channels, rate = 12, None, 1, TELEPHONY_SAMPLE_RATE
+    while pos + 8 <= len(data):
+        chunk_id = bytes(view[pos:pos + 4])
+        size = struct.unpack_from("<I", data, pos + 4)[0]
+        body = pos + 8
+        if chunk_id == b"fmt ":
+            tag, channels, rate = struct.unpack_from("<HHI", data, body)
+            encoding = {_WAVE_FORMAT_MULAW: "mulaw", _WAVE_FORMAT_ALAW: "alaw"}.get(tag)
+            if encoding is None:
+                return None
+        elif chunk_id == b"data" and encoding is not None:
+            payload = view[body:min(body + size, len(data))]
+            payload = payload[:len(payload) - len(payload) % channels]
+            y = decode_g711(payload, encoding)
+            if channels > 1:
+                y = y.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+            return y, rate
+        pos = body + size + (size & 1)
+    return None
+
+
+# ============================================
+# DÉCODAGE GÉNÉRIQUE
+# ============================================
+
+def _to_mono(y: np.ndarray) -> np.ndarray:
+    # Même convention que librosa.to_mono : moyenne des canaux
+    return y[:, 0] if y.shape[1] == 1 else y.mean(axis=1, dtype=np.float32)
+
+
+def _read_soundfile(source):
+    """WAV / FLAC / OGG (et MP3 avec libsndfile >= 1.1), depuis un chemin ou des octets"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    y, rate = sf.read(source, dtype="float32", always_2d=True)
+    return _to_mono(y), rate
+
+
+def _read_ffmpeg(source, sr):
+    """
+    Autres formats (M4A/AAC, WebM, MP3 sans support libsndfile) : ffmpeg en pipe,
+    sortie PCM float32 mono directement à sr (pas de rééchantillonnage ensuite).
+    """
+    from_memory = not isinstance(source, str)
+    cmd = [
+        "ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error",
+        "-i", "pipe:0" if from_memory else source,
+        "-f", "f32le", "-ac", "1", "-ar", str(sr), "pipe:1",
+    ]
+    try:
+        proc = subprocess.run(
+            cmd,
+            input=bytes(source) if from_memory else None,
+            stdin=None if from_memory else subprocess.DEVNULL,
+            capture_output=True,
+            check=False,
+        )
+    except FileNotFoundError:
+        raise AudioDecodeError("ffmpeg introuvable pour ce format audio")
+    if proc.returncode != 0:
+        raise AudioDecodeError(proc.stderr.decode("utf-8", "replace").strip() or "Échec ffmpeg")
+    return np.frombuffer(proc.stdout, dtype=np.float32), sr
+
+
+def _read_bytes(source) -> bytes:
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return f.read()
+    return source
+
+
+def resample(y: np.ndarray, orig_sr: int, target_sr: int, quality: str = None) -> np.ndarray:
+    """Rééchantillonnage soxr ; aucun calcul si l'audio est déjà à target_sr"""
+    if orig_sr == target_sr:
+        return y
+    quality = quality or settings.resample_quality
+    if quality not in RESAMPLE_QUALITIES:
+        raise ValueError(f"Qualité de rééchantillonnage inconnue : {quality}")
+    return soxr.resample(y, orig_sr, target_sr, quality=RESAMPLE_QUALITIES[quality]).astype(np.float32, copy=False)
+
+
+def decode_audio(source, sr: int = SAMPLE_RATE, encoding: str = None) -> np.ndarray:
+    """
+    Décode un audio (chemin ou octets en mémoire) en signal mono float32 à sr.
+    encoding : "mulaw" / "alaw" pour du G.711 brut à 8 kHz (sans en-tête).
+    Aucun fichier temporaire n'est écrit.
+    """
+    decoded = None
+    if encoding is not None:
+        decoded = decode_g711(_read_bytes(source), encoding), TELEPHONY_SAMPLE_RATE
+    else:
+        if isinstance(source, str) and source.lower().endswith(".wav"):
+            source = _read_bytes(source)  # lu une seule fois, quel que soit le décodeur
+        if not isinstance(source, str):
+            decoded = _read_g711_wav(source)
+
+    if decoded is None:
+        try:
+            decoded = _read_soundfile(source)
+        except (sf.LibsndfileError, RuntimeError, TypeError):
+            decoded = _read_ffmpeg(source, sr)
+    y, rate = decoded
+    return resample(np.ascontiguousarray(y), rate, sr)
+
+
+def audio_duration_ms(source, encoding: str = None, default_bytes_per_s: int = 32000) -> float:
+    """
+    Durée d'un audio sans le décoder (en-tête soundfile, taille pour le G.711
+    brut). Formats lus par ffmpeg : estimation depuis la taille du fichier.
+    """
+    if encoding is not None:
+        return len(_read_bytes(source)) / TELEPHONY_SAMPLE_RATE * 1000
+    try:
+        info = sf.info(source if isinstance(source, str) else io.BytesIO(source))
+        return info.frames / info.samplerate * 1000
+    except (sf.LibsndfileError, RuntimeError, TypeError):
+        size = os.path.getsize(source) if isinstance(source, str) else len(source)
+        return size / default_bytes_per_s * 1000
+
+
+# ============================================
+# BENCHMARK
+# ============================================
+
+def _telephony_wav(seconds: float, encoding: str) -> bytes:
+    """Signal synthétique (voix simulée + bruit) encodé en WAV G.711 8 kHz"""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * TELEPHONY_SAMPLE_RATE)) / TELEPHONY_SAMPLE_RATE
+    y = 0.3 * np.sin(2 * np.pi * 180 * t) * (1 + np.sin(2 * np.pi * 3 * t)) / 2
+    y += 0.02 * rng.standard_normal(len(t))
+    buffer = io.BytesIO()
+    sf.write(buffer, y.astype(np.float32), TELEPHONY_SAMPLE_RATE, format="WAV",
+             subtype="ULAW" if encoding == "mulaw" else "ALAW")
+    return buffer.getvalue()
+
+
+def _best_ms(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def run_benchmark(seconds: float = 60.0, repeats: int = 5):
+    """Coût décodage + rééchantillonnage (ms par minute d'audio) pour chaque mode"""
+    per_minute = 60.0 / seconds
+    print(f"{'entrée':<22}{'qualité':<10}{'décodage':>12}{'rééchant.':>12}{'total':>12}")
+    for encoding in G711_ENCODINGS:
+        data = _telephony_wav(seconds, encoding)
+        decode_lut = _best_ms(lambda: _read_g711_wav(data), repeats)
+        decode_sf = _best_ms(lambda: _read_soundfile(data), repeats)
+        print(f"{'g711 ' + encoding + ' (soundfile)':<22}{'-':<10}{decode_sf * per_minute:>9.2f} ms")
+        y, rate = _read_g711_wav(data)
+        for quality in RESAMPLE_QUALITIES:
+            res = _best_ms(lambda: resample(y, rate, SAMPLE_RATE, quality), repeats)
+            print(f"{'g711 ' + encoding + ' (table)':<22}{quality:<10}{decode_lut * per_minute:>9.2f} ms"
+                  f"{res * per_minute:>9.2f} ms{(decode_lut + res) * per_minute:>9.2f} ms")
+
+    # Audio déjà au débit du modèle : pas de rééchantillonnage
+    buffer = io.BytesIO()
+    sf.write(buffer, np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32), SAMPLE_RATE,
+             format="WAV", subtype="PCM_16")
+    data = buffer.getvalue()
+    total = _best_ms(lambda: decode_audio(data), repeats)
+    print(f"{f'pcm16 {SAMPLE_RATE} Hz':<22}{'(aucune)':<10}{total * per_minute:>9.2f} ms"
+          f"{0.0:>9.2f} ms{total * per_minute:>9.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Décodage audio")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench = sub.add_parser("bench", help="Coût décodage + rééchantillonnage par minute d'audio")
+    bench.add_argument("--seconds", type=float, default=60.0)
+    bench.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    run_benchmark(args.seconds, args.repeats)
@@ -0,0 +1,111 @@
+import struct
+import uuid
+
+import numpy as np
+import soxr
+
+from app.config import settings
+from app.services.audio_decoder import decode_g711, RESAMPLE_QUALITIES
+from app.services.feature_engine import SAMPLE_RATE
+
+
+# Protocole binaire /ws/agent : une trame = en-tête fixe + audio brut
+#   version     uint8
+#   encodage    uint8    (ENCODINGS)
+#   réservé     uint16   (0)
+#   sample_rate uint32   (Hz)
+#   timestamp   float64  (secondes depuis le début de l'appel)
+#   call_id     16 octets (UUID binaire)
+# little-endian, 32 octets, suivi des échantillons mono
+PROTOCOL_VERSIONS = (1,)
+HEADER = struct.Struct("<BBHId16s")
+
+ENCODINGS = {
+    0: "pcm_s16le",
+    1: "pcm_f32le",
+    2: "mulaw",
+    3: "alaw",
+}
+
+
+class ProtocolError(ValueError):
+    """Trame binaire ou négociation invalide"""
+
+
+def negotiate(client_versions) -> int:
+    """Plus haute version commune au client et au serveur"""
+    common = set(PROTOCOL_VERSIONS).intersection(int(v) for v in client_versions)
+    if not common:
+        raise ProtocolError(f"Aucune version commune (serveur : {list(PROTOCOL_VERSIONS)})")
+    return max(common)
+
+
+def _samples(payload, encoding: int) -> np.ndarray:
+    """Audio de la trame -> float32 (vue directe sur le buffer pour pcm_f32le)"""
+    name = ENCODINGS.get(encoding)
+    if name is None:
+        raise ProtocolError(f"Encodage inconnu : {encoding}")
+    if name in ("mulaw", "alaw"):
+        return decode_g711(payload, name)
+    dtype = np.dtype("<i2") if name == "pcm_s16le" else np.dtype("<f4")
+    if len(payload) % dtype.itemsize:
+        raise ProtocolError("Taille de l'audio incohérente avec l'encodage")
+    pcm = np.frombuffer(payload, dtype=dtype)
+    if name == "pcm_f32le":
+        return pcm
+    # Même échelle que soundfile
+    return np.multiply(pcm, 1 / 32768, dtype=np.float32)
+
+
+class AgentAudioSession:
+    """
+    État binaire d'une connexion agent : version négociée et
+    rééchantillonneur continu de l'appel en cours (pas d'artefacts entre
+    trames). Un agent ne traite qu'un appel à la fois : une trame d'un autre
+    appel libère le rééchantillonneur du précédent.
+    """
+
+    def __init__(self):
+        self.version = None  # None = toute version supportée (pas de hello)
+        self.resampler = None  # (call_id, sample_rate, soxr.ResampleStream)
+
+    def hello(self, client_versions) -> dict:
+        """Réponse à {"type": "hello", "protocol_versions": [...]}"""
+        self.version = negotiate(client_versions)
+        return {
+            "type": "hello_ack",
+            "protocol_version": self.version,
+            "header_size": HEADER.size,
+            "encodings": list(ENCODINGS.values()),
+        }
+
+    def _resample(self, call_id: str, samples, sample_rate: int):
+        if self.resampler is not None and self.resampler[0] != call_id:
+            self.resampler = None
+        if sample_rate == SAMPLE_RATE:
+            return samples
+        if self.resampler is None or self.resampler[1] != sample_rate:
+            stream = soxr.ResampleStream(
+                sample_rate, SAMPLE_RATE, 1, dtype="float32",
+                quality=RESAMPLE_QUALITIES[settings.resample_quality],
+            )
+            self.resampler = (call_id, sample_rate, stream)
+        return self.resampler[2].resample_chunk(samples)
+
+    def end_call(self, call_id: str):
+        """Appel terminé : libère son rééchantillonneur"""
+        if self.resampler is not None and self.resampler[0] == call_id:
+            self.resampler = None
+
+    def decode(self, data):
+        """Trame binaire -> (call_id, timestamp, échantillons float32 à SAMPLE_RATE)"""
+        if len(data) < HEADER.size:
+            raise ProtocolError(f"Trame trop courte ({len(data)} octets)")
+        version, encoding, _, sample_rate, timestamp, raw_id = HEADER.unpack_from(data)
+        if version not in PROTOCOL_VERSIONS or (self.version is not None and version != self.version):
+            raise ProtocolError(f"Version de protocole non négociée : {version}")
+        if not sample_rate:
+            raise ProtocolError("Fréquence d'échantillonnage nulle")
+        call_id = str(uuid.UUID(bytes=raw_id))
+        samples = _samples(memoryview(data)[HEADER.size:], encoding)
+        return call_id, timestamp, self._resample(call_id, samples, sample_rate)
@@ -0,0 +1,188 @@
+import asyncio
+import hashlib
+import io
+import os
+import zipfile
+from contextlib import aclosing
+
+from fastapi import HTTPException, Request
+
+from app.config import settings
+from app.services.audio_decoder import g711_encoding_for
+from app.services.admission import admission
+from app.services.upload_ingest import iter_uploads, _too_large
+
+
+# Schéma OpenAPI du corps multipart (plusieurs fichiers et/ou archives zip)
+BATCH_UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "files": {"type": "array", "items": {"type": "string", "format": "binary"}},
+                    },
+                    "required": ["files"],
+                }
+            }
+        },
+    }
+}
+
+
+class ArchiveMember:
+    """Fichier audio extrait d'une archive zip (en mémoire, même interface qu'un upload)"""
+
+    def __init__(self, filename: str, data: bytes = None, error: str = None):
+        self.filename = filename
+        self.source = data
+        self.error = error
+        self.sha256 = hashlib.sha256(data).hexdigest() if data is not None else None
+
+    async def cleanup(self):
+        self.source = None
+
+
+def _is_zip(upload) -> bool:
+    if upload.filename.lower().endswith(".zip"):
+        return True
+    source = upload.source
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            source = f.read(4)
+    return source[:4] == b"PK\x03\x04"
+
+
+def _open_zip(upload):
+    source = upload.source
+    return zipfile.ZipFile(source if isinstance(source, str) else io.BytesIO(source))
+
+
+def _read_member(archive, info, max_bytes):
+    if info.file_size > max_bytes:
+        return ArchiveMember(info.filename, error=f"Fichier trop volumineux (max {max_bytes // (1024 * 1024)} Mo)")
+    return ArchiveMember(info.filename, archive.read(info))
+
+
+def _too_many_files():
+    return HTTPException(
+        status_code=413,
+        detail=f"Trop de fichiers dans le lot (max {settings.batch_max_files})",
+    )
+
+
+async def iter_batch_items(request: Request):
+    """
+    Fichiers audio du lot, dans l'ordre de réception : fichiers du formulaire
+    et membres des archives zip (lus un par un, à la demande).
+    L'appelant est responsable de item.cleanup().
+    """
+    max_file_bytes = settings.max_audio_size_mb * 1024 * 1024
+    count = 0
+    async with aclosing(iter_uploads(request, settings.batch_max_size_mb * 1024 * 1024)) as uploads:
+        async for upload in uploads:
+            try:
+                if not await asyncio.to_thread(_is_zip, upload):
+                    count += 1
+                    if count > settings.batch_max_files:
+                        raise _too_many_files()
+                    item, upload = upload, None
+                    if item.size > max_file_bytes:
+                        await item.cleanup()
+                        item = ArchiveMember(item.filename, error=_too_large(max_file_bytes).detail)
+                    yield item
+                    continue
+
+                try:
+                    archive = await asyncio.to_thread(_open_zip, upload)
+                except zipfile.BadZipFile:
+                    yield ArchiveMember(upload.filename, error="Archive zip invalide")
+                    continue
+                with archive:
+                    for info in archive.infolist():
+                        name = os.path.basename(info.filename)
+                        if info.is_dir() or not name or name.startswith(".") or info.filename.startswith("__MACOSX/"):
+                            continue
+                        count += 1
+                        if count > settings.batch_max_files:
+                            raise _too_many_files()
+                        yield await asyncio.to_thread(_read_member, archive, info, max_file_bytes)
+            finally:
+                # Archive zip : supprimée une fois tous ses membres lus
+                if upload is not None:
+                    await upload.cleanup()
+
+
+class BatchAnalysis:
+    """
+    Analyse d'un lot avec une concurrence bornée. receive() lit le corps et
+    lance chaque analyse dès que son fichier est reçu ; la lecture est
+    suspendue tant qu'aucune place n'est libre (pas d'accumulation de
+    fichiers en attente). results() produit ensuite (nom, résultat) au fur et
+    à mesure des fins d'analyse. Les fenêtres de tous les fichiers en cours
+    partagent les batches du scheduler d'inférence.
+    """
+
+    def __init__(self, concurrency: int = None):
+        concurrency = concurrency or settings.batch_concurrency or os.cpu_count() or 1
+        self.slots = asyncio.Semaphore(concurrency)
+        self.done = asyncio.Queue()
+        self.tasks = set()
+        self.started = 0
+
+    async def _analyze(self, item):
+        from app.services.emotion_ai_service import emotion_service
+        error = getattr(item, "error", None)
+        # finally unique : fichier nettoyé et place rendue même si la tâche est annulée
+        try:
+            try:
+                if error:
+                    result = emotion_service._get_error_result(error)
+                else:
+                    # Places globales partagées avec les uploads synchrones
+                    async with admission.admit(reject=False):
+                        result = await emotion_service.analyze_audio_file(
+                            item.source, audio_hash=item.sha256, encoding=g711_encoding_for(item.filename)
+                        )
+            except Exception as e:
+                print(f"[Batch] Erreur {item.filename}: {e}")
+                result = emotion_service._get_error_result("Erreur interne lors de l'analyse")
+            self.done.put_nowait((item.filename, result))
+        finally:
+            await item.cleanup()
+            self.slots.release()
+
+    async def receive(self, request: Request):
+        """
+        Lit tout le corps de la requête (à appeler avant de commencer la
+        réponse : Starlette lit aussi receive() pendant une réponse streamée).
+        En cas d'erreur, les analyses lancées sont annulées.
+        """
+        try:
+            async with aclosing(iter_batch_items(request)) as items:
+                async for item in items:
+                    await self.slots.acquire()
+                    task = asyncio.create_task(self._analyze(item))
+                    self.tasks.add(task)
+                    task.add_done_callback(self.tasks.discard)
+                    self.started += 1
+        except BaseException:
+            await self.cancel()
+            raise
+
+    async def results(self):
+        """(nom de fichier, résultat) dans l'ordre de fin d'analyse"""
+        try:
+            for _ in range(self.started):
+                yield await self.done.get()
+        finally:
+            # Client parti avant la fin : les analyses restantes sont abandonnées
+            await self.cancel()
+
+    async def cancel(self):
+        for task in list(self.tasks):
+            task.cancel()
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
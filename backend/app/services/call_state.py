@@ -0,0 +1,92 @@
+from datetime import datetime
+
+import numpy as np
+
+from app.models.schemas import EmotionType
+
+
+# Code numérique de chaque émotion dans l'historique
+EMOTIONS = list(EmotionType)
+EMOTION_CODES = {emotion: code for code, emotion in enumerate(EMOTIONS)}
+
+
+class EmotionHistory:
+    """
+    Historique borné des émotions d'un appel : anneau de tableaux numpy
+    (code émotion, confiance, timestamp), converti en dicts à l'envoi seulement.
+    """
+
+    __slots__ = ("codes", "confidences", "timestamps", "count")
+
+    def __init__(self, capacity: int):
+        self.codes = np.zeros(capacity, dtype=np.uint8)
+        self.confidences = np.zeros(capacity, dtype=np.float32)
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.count = 0  # entrées ajoutées depuis le début de l'appel
+
+    def append(self, emotion: EmotionType, confidence: float, timestamp: float):
+        slot = self.count % len(self.codes)
+        self.codes[slot] = EMOTION_CODES[EmotionType(emotion)]
+        self.confidences[slot] = confidence
+        self.timestamps[slot] = timestamp
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, len(self.codes))
+
+    def to_list(self) -> list:
+        """Entrées conservées, de la plus ancienne à la plus récente"""
+        slots = np.arange(self.count - len(self), self.count) % len(self.codes)
+        return [
+            {"emotion": EMOTIONS[code].value, "confidence": confidence, "timestamp": timestamp}
+            for code, confidence, timestamp in zip(
+                self.codes[slots].tolist(), self.confidences[slots].tolist(), self.timestamps[slots].tolist()
+            )
+        ]
+
+
+class CallState:
+    """État d'un appel actif (taille fixe, historique borné)"""
+
+    __slots__ = (
+        "id", "agent_id", "agent_name", "team_id", "start_time",
+        "emotion", "confidence", "timestamp", "history",
+        "alert_triggered", "alert_duration",
+    )
+
+    def __init__(self, call_id: str, agent_id: str, agent_name: str, team_id: str, history_size: int):
+        self.id = call_id
+        self.agent_id = agent_id
+        self.agent_name = agent_name
+        self.team_id = team_id
+        self.start_time = datetime.utcnow().isoformat()
+        # Émotion courante
+        self.emotion = EmotionType.CALM
+        self.confidence = 80.0
+        self.timestamp = 0.0
+        self.history = EmotionHistory(history_size)
+        self.alert_triggered = False
+        self.alert_duration = 0.0  # secondes d'émotion négative cumulées
+
+    def set_emotion(self, emotion: EmotionType, confidence: float, timestamp: float):
+        self.emotion = EmotionType(emotion)
+        self.confidence = confidence
+        self.timestamp = timestamp
+        self.history.append(self.emotion, confidence, timestamp)
+
+    def current_emotion(self) -> dict:
+        return {"emotion": self.emotion.value, "confidence": self.confidence, "timestamp": self.timestamp}
+
+    def to_dict(self) -> dict:
+        """Représentation envoyée aux clients (même format que ActiveCall)"""
+        return {
+            "id": self.id,
+            "agent_id": self.agent_id,
+            "agent_name": self.agent_name,
+            "team_id": self.team_id,
+            "start_time": self.start_time,
+            "current_emotion": self.current_emotion(),
+            "emotion_history": self.history.to_list(),
+            "alert_triggered": self.alert_triggered,
+            "alert_duration": self.alert_duration,
+        }
@@ -0,0 +1,103 @@
+import functools
+
+import numpy as np
+from scipy.signal import fftconvolve, filtfilt
+
+from app.config import settings
+from app.services.feature_engine import N_FFT, HOP_LENGTH, SAMPLE_RATE
+
+
+@functools.lru_cache(maxsize=None)
+def _smoothing_filter(sr, n_fft, hop_length, freq_smooth_hz, time_smooth_ms):
+    """Filtre triangulaire 2D (fréquence x temps) de lissage du masque (comme noisereduce)"""
+    n_freq = max(1, int(freq_smooth_hz / (sr / (n_fft / 2))))
+    n_time = max(1, int(time_smooth_ms / (hop_length / sr * 1000)))
+
+    def ramp(n):
+        return np.concatenate([
+            np.linspace(0, 1, n + 1, endpoint=False),
+            np.linspace(1, 0, n + 2),
+        ])[1:-1]
+
+    smoothing = np.outer(ramp(n_freq), ramp(n_time))
+    return (smoothing / smoothing.sum()).astype(np.float32)
+
+
+class SpectralGate:
+    """
+    Débruitage par gating spectral non stationnaire (algorithme de
+    noisereduce.reduce_noise), appliqué directement au spectrogramme de
+    puissance partagé avec l'extraction de features : ni STFT dédiée ni
+    retour dans le domaine temporel.
+    Le débruitage est ignoré quand le SNR estimé dépasse snr_threshold_db.
+    """
+
+    def __init__(self, snr_threshold_db: float, prop_decrease: float,
+                 n_fft=N_FFT, hop_length=HOP_LENGTH, time_constant_s=2.0,
+                 freq_mask_smooth_hz=500, time_mask_smooth_ms=50,
+                 thresh_n_mult=2.0, sigmoid_slope=10.0):
+        self.snr_threshold_db = snr_threshold_db
+        self.prop_decrease = prop_decrease
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.time_constant_s = time_constant_s
+        self.freq_mask_smooth_hz = freq_mask_smooth_hz
+        self.time_mask_smooth_ms = time_mask_smooth_ms
+        self.thresh_n_mult = thresh_n_mult
+        self.sigmoid_slope = sigmoid_slope
+
+    def estimate_snr(self, S) -> float:
+        """
+        SNR (dB) estimé sur l'énergie des trames : plancher de bruit = 10e
+        percentile, signal = 90e percentile.
+        """
+        energy = S.sum(axis=0, dtype=np.float64)
+        noise, signal = np.percentile(energy, [10, 90])
+        if signal <= 0:
+            return float("inf")  # silence : rien à débruiter
+        return float(10 * np.log10(signal / max(noise, signal * 1e-10)))
+
+    def mask(self, S, sr=SAMPLE_RATE) -> np.ndarray:
+        """Masque d'amplitude (F, T) : 1 - prop_decrease sur le bruit, 1 sur le signal"""
+        magnitude = np.sqrt(S)
+        # Moyenne lissée dans le temps (IIR aller-retour, constante time_constant_s)
+        t_frames = self.time_constant_s * sr / float(self.hop_length)
+        b = (np.sqrt(1 + 4 * t_frames ** 2) - 1) / (2 * t_frames ** 2)
+        smooth = filtfilt([b], [1, b - 1], magnitude, axis=-1, padtype=None)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            above = (magnitude - smooth) / smooth
+        above = np.nan_to_num(above, nan=0.0, posinf=0.0, neginf=0.0)
+        mask = 1 / (1 + np.exp(-(above - self.thresh_n_mult) * self.sigmoid_slope))
+
+        smoothing = _smoothing_filter(sr, self.n_fft, self.hop_length,
+                                      self.freq_mask_smooth_hz, self.time_mask_smooth_ms)
+        mask = fftconvolve(mask, smoothing, mode="same")
+        return (mask * self.prop_decrease + (1.0 - self.prop_decrease)).astype(np.float32)
+
+    def apply(self, S, rms, sr=SAMPLE_RATE, report=None, snr_db=None):
+        """
+        Retourne (S, rms) débruités, ou inchangés si l'audio est assez propre.
+        snr_db : SNR déjà estimé (ex. par la VAD, parole vs silences), sinon
+        estimé sur S. report (optionnel) reçoit snr_db et denoised.
+        """
+        if snr_db is None:
+            snr_db = self.estimate_snr(S)
+        denoised = snr_db < self.snr_threshold_db
+        if denoised:
+            before = S.sum(axis=0)
+            S = S * np.square(self.mask(S, sr))
+            # RMS des trames mis à l'échelle du gain d'énergie du masque
+            with np.errstate(divide="ignore", invalid="ignore"):
+                gain = np.where(before > 0, S.sum(axis=0) / before, 1.0)
+            rms = (rms * np.sqrt(gain)).astype(np.float32)
+        if report is not None:
+            report["snr_db"] = snr_db
+            report["denoised"] = denoised
+        return S, rms
+
+
+spectral_gate = SpectralGate(
+    snr_threshold_db=settings.denoise_snr_threshold_db,
+    prop_decrease=settings.denoise_prop_decrease,
+)
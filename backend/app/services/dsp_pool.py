@@ -0,0 +1,127 @@
+import asyncio
+import os
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+from app.config import settings
+from app.services.pipeline_stats import pipeline_stats
+
+
+# ============================================
+# CÔTÉ WORKER (processus séparé, sans TensorFlow)
+# ============================================
+
+def _warm_worker():
+    """Initialiseur : charge librosa/scipy et compile leurs chemins chauds"""
+    from app.services.emotion_ai_service import emotion_service
+    y = (np.random.default_rng(0).standard_normal(22050) * 0.01).astype(np.float32)
+    emotion_service.extract_features(y)
+
+
+def _ping():
+    return os.getpid()
+
+
+def _prepare_in_worker(source, encoding=None):
+    """
+    Décodage + débruitage + features + normalisation (float32, en place) dans
+    le worker. La matrice est déposée en mémoire partagée ; seul son
+    descripteur est picklé.
+    """
+    from app.services.emotion_ai_service import emotion_service
+    report = {}
+    features, duration, segments = emotion_service._prepare_audio(source, encoding=encoding, report=report)
+    features = emotion_service._scale(np.ascontiguousarray(features, dtype=np.float32), inplace=True)
+
+    shm = shared_memory.SharedMemory(create=True, size=max(features.nbytes, 1))
+    np.ndarray(features.shape, dtype=features.dtype, buffer=shm.buf)[:] = features
+    # Le processus principal devient propriétaire du segment (il le libère)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    shm.close()
+    return shm.name, features.shape, features.dtype.str, duration, segments, report
+
+
+# ============================================
+# CÔTÉ SERVICE
+# ============================================
+
+def _release_segment(future):
+    """Résultat jamais relu (appelant annulé) : libère le segment partagé"""
+    if future.cancelled() or future.exception() is not None:
+        return
+    try:
+        shm = shared_memory.SharedMemory(name=future.result()[0])
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+class DSPPool:
+    """Pool de processus pour l'étape décodage / débruitage / features"""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.executor = None
+
+    @property
+    def running(self) -> bool:
+        return self.executor is not None
+
+    async def start(self):
+        """Crée le pool et pré-chauffe chaque worker (appelé à initialize())"""
+        if self.workers <= 0 or self.executor is not None:
+            return
+        # spawn : ne pas hériter de l'état TensorFlow / de la boucle asyncio du parent
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=_warm_worker,
+        )
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[
+            loop.run_in_executor(self.executor, _ping) for _ in range(self.workers)
+        ])
+        print(f" DSP process pool ready ({self.workers} workers)")
+
+    async def stop(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def run(self, source, encoding=None, report=None):
+        """
+        Exécute le pipeline DSP dans un worker ; la matrice normalisée est
+        relue depuis la mémoire partagée (une seule copie, sans pickling).
+        Retourne (features normalisées, durée en ms, segments de parole) ;
+        le rapport du worker est ajouté à report s'il est fourni.
+        """
+        future = self.executor.submit(_prepare_in_worker, source, encoding)
+        try:
+            name, shape, dtype, duration, segments, worker_report = await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Le worker peut encore créer le segment : il est libéré à la fin
+            future.add_done_callback(_release_segment)
+            raise
+        pipeline_stats.record(worker_report)
+        if report is not None:
+            report.update(worker_report)
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            features = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+            result = np.array(features)
+            del features
+        finally:
+            try:
+                shm.close()
+            except BufferError:
+                pass
+            shm.unlink()
+        return result, duration, segments
+
+
+# Instance globale
+dsp_pool = DSPPool(workers=settings.dsp_workers)
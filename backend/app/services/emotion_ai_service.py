@@ -1,11 +1,21 @@
 import os
 import asyncio
+import hashlib
 import numpy as np
-import librosa
-import soundfile as sf
-import noisereduce as nr
 import warnings
-import tensorflow as tf
+
+from app.config import settings
+from app.services.inference_scheduler import inference_scheduler
+from app.services.dsp_pool import dsp_pool
+from app.services.inference_backends import KerasBackend, create_backend
+from app.services.result_cache import result_cache
+from app.services.feature_store import feature_store, settings_fingerprint, DSP_SETTINGS
+from app.services.feature_engine import feature_engine, HOP_LENGTH, SAMPLE_RATE, N_FEATURES
+from app.services.audio_decoder import decode_audio
+from app.services.denoiser import spectral_gate
+from app.services.voice_activity import voice_activity, segment_frames
+from app.services.pipeline_stats import pipeline_stats, timed
+from app.services.realtime_inference import realtime_inference
 
 # 1. LISTE DES ÉMOTIONS
 EMOTION_LABELS = ["anger", "disgust", "fear", "happiness", "neutral", "sadness", "surprise"]
@@ -23,36 +33,75 @@ APP_MAPPING = {
 
 CONFIDENCE_THRESHOLD = 40.0
 
+# Version du pipeline DSP/post-traitement : à incrémenter quand les résultats changent
+# (invalide le cache des résultats)
+PIPELINE_VERSION = "5"
+
+# Réglages qui modifient les résultats : inclus dans la clé du cache
+# (un changement par variable d'environnement ne relit pas d'anciens résultats)
+PIPELINE_SETTINGS = DSP_SETTINGS + ("analysis_hop_frames",)
+
+
+def pipeline_fingerprint() -> str:
+    """Version du pipeline + empreinte des réglages qui modifient les résultats"""
+    return f"{PIPELINE_VERSION}:{settings_fingerprint(PIPELINE_SETTINGS)}"
+
 
 
 MEAN_VALUES = [-157.5376399920511, 37.104176491834, 2.0337274901687827, 12.096118323251734, -2.6183034613828085, 3.8309959257822093, -4.464458941893074, 0.3853365876428498, -3.836964942744795, 0.15526941160967642, -1.5735285955856781, -1.106138165365508, 0.1502976427590345, -1.754574038217257, 0.6562882481533799, -2.236795964560841, 0.1306130645389689, -1.4041705146971206, -0.23838966643544662, -0.8626021427811784, -0.8048591070921447, 0.04108076941695366, -1.0266471079234103, 0.8428409960241059, -0.7696151057547994, 1.2882513892724914, -0.6222886801577415, 1.1123151323514966, -0.25761544061212827, 0.7041739319453465, 0.3777561819327231, 0.5657496054651174, 0.9088223554975404, 0.3969925617587496, 1.1152420207611935, 0.5580622977776358, 1.2853996500773537, 0.5281862199831295, 0.7436884988057614, 0.4702020240977001, 0.13692784095083424, 0.14103712986063205, 0.13288571534211824, 0.1292212725107591, 0.1354360190566245, 0.13964814112214252, 0.14899128134526263, 0.1521282361035045, 0.16017507463942432, 0.17898225791832817, 0.17688434588986468, 0.14599475255180538, 0.04229088609350673, 0.010822040675040995]  # <--- Colle la liste MEAN_VALUES ici (entre les crochets si besoin, ou remplace la ligne)
+# Les features stockées sont normalisées : modifier MEAN/SCALE impose
+# d'incrémenter FEATURE_EXTRACTOR_VERSION (feature_engine.py)
 SCALE_VALUES = [222.85612115107307, 61.17949308927245, 21.89513825086182, 25.796334756328317, 15.50026951717583, 15.328412103762092, 12.281292652708489, 10.705496209284089, 9.954390821480084, 7.055192168875377, 7.373486647650547, 6.660602896049189, 6.27800719639942, 6.93325273296583, 5.94919429407967, 6.9122046443525464, 5.600844702658633, 6.501945223053441, 5.431095086439593, 5.672665985806625, 5.460056398519643, 5.278044131359135, 5.65161557363057, 5.882537844587294, 5.988897013508849, 6.008446033772659, 5.88663390316108, 5.723679148683852, 5.517436769793056, 5.623403380673723, 5.539112067091, 5.78399099077947, 5.586391695835036, 5.718617761890974, 5.679342388751273, 5.88214423455808, 5.922523864119022, 5.826724386432337, 5.320898483216886, 5.016582068449478, 0.2601547346398352, 0.267408195329046, 0.2568373997265808, 0.2523953162556582, 0.2613357880283109, 0.2658489998963256, 0.2774050826090312, 0.2790472496403702, 0.2883048093015046, 0.316478012244662, 0.31541873973271006, 0.26945816151644725, 0.10968277300307572, 0.03579500089220182] # <--- Colle la liste SCALE_VALUES ici
 
+# Constantes précompilées (float32, une seule fois au chargement du module)
+_MEAN = np.asarray(MEAN_VALUES, dtype=np.float32)
+_SCALE = np.asarray(SCALE_VALUES, dtype=np.float32)
+# Trame nulle une fois normalisée (padding des fenêtres)
+_SCALED_ZERO = -_MEAN / _SCALE if len(MEAN_VALUES) > 0 else np.float32(0)
+
 
 
 
 class EmotionAIService:
     def __init__(self):
         self.model = None
+        self.model_version = None
         self.tf_available = False
         
         base_path = os.path.dirname(__file__)
         self.model_path = os.path.join(base_path, "../models/speech_emotion_model.keras")
 
+    def _load_backend(self, backend):
+        backend.load()
+        with open(self.model_path, "rb") as f:
+            weights_hash = hashlib.sha256(f.read()).hexdigest()[:16]
+        self.model = backend
+        self.model_version = f"{backend.name}:{backend.quantization}:{weights_hash}"
+        self.tf_available = True
+        print(f" Emotion model loaded ({backend.name})")
+
     async def initialize(self):
-        """Initialise TensorFlow et le Modèle"""
+        """Charge le modèle via le backend choisi (keras / tflite / onnx)"""
+        loop = asyncio.get_running_loop()
+        backend = None
         try:
-            import tensorflow as tf
-            self.tf_available = True
-            print(" TensorFlow loaded")
-            if os.path.exists(self.model_path):
-                self.model = tf.keras.models.load_model(self.model_path)
-                print(" Emotion model loaded")
-            else:
-                print(f" Modèle introuvable au chemin : {self.model_path}")
+            backend = create_backend(
+                settings.emotion_model_type, self.model_path,
+                settings.emotion_model_path, settings.emotion_model_quantization
+            )
+            # Conversion éventuelle au premier démarrage (hors boucle asyncio)
+            await loop.run_in_executor(None, self._load_backend, backend)
         except Exception as e:
-            print(" Erreur modèle/TF:", e)
-            self.tf_available = False
+            print(f" Erreur modèle ({settings.emotion_model_type}):", e)
+            if backend is None or backend.name != KerasBackend.name:
+                # Repli sur le modèle Keras d'origine si le runtime léger est indisponible
+                try:
+                    await loop.run_in_executor(None, self._load_backend, KerasBackend(self.model_path))
+                except Exception as e:
+                    print(" Erreur modèle/TF:", e)
+
+        if self.model is not None:
+            await inference_scheduler.start(self._predict_batch)
             
         # Plus besoin de charger le scaler, on a les valeurs en dur !
         if len(MEAN_VALUES) > 0:
@@ -60,100 +109,277 @@ class EmotionAIService:
         else:
             print(" ATTENTION : Les valeurs MEAN_VALUES sont vides !")
 
-    def _clean_audio(self, file_path):
-        """Nettoie le bruit de l'audio"""
+        # Workers DSP pré-chauffés (imports librosa + JIT) avant la première requête
         try:
-            data, rate = librosa.load(file_path, sr=22050)
-            reduced_noise = nr.reduce_noise(y=data, sr=rate, prop_decrease=0.8)
-            clean_path = file_path.replace(".wav", "_clean.wav").replace(".mp3", "_clean.wav")
-            sf.write(clean_path, reduced_noise, rate)
-            return clean_path
+            await dsp_pool.start()
+        except Exception as e:
+            print(" Erreur pool DSP, repli sur les threads:", e)
+            await dsp_pool.stop()
+
+    async def shutdown(self):
+        """Arrête les ressources d'inférence (appelé à l'arrêt de l'application)"""
+        await inference_scheduler.stop()
+        await dsp_pool.stop()
+
+    def _predict_batch(self, X):
+        """Appel direct au modèle (exécuté par le thread unique du scheduler)"""
+        return self.model.predict(X)
+
+    def _load_audio(self, source, sr=22050, encoding=None):
+        """Décode et rééchantillonne une seule fois (chemin ou octets, float32 en mémoire).
+        encoding : "mulaw" / "alaw" pour du G.711 brut (PBX, 8 kHz)"""
+        return decode_audio(source, sr=sr, encoding=encoding)
+
+    def _detect_speech(self, y, sr=22050, report=None):
+        """
+        Segments de parole (N, 2) en trames [début, fin) de l'enregistrement,
+        et SNR parole / silences (None si non mesurable).
+        Sans VAD : un seul segment couvrant tout l'enregistrement.
+        """
+        n_frames = feature_engine.n_frames(len(y))
+        if len(y) < 2048:
+            segments, snr_db = np.zeros((0, 2), dtype=np.int64), None
+        elif settings.vad_enabled:
+            segments, snr_db = voice_activity.detect(y, sr=sr)
+        else:
+            segments, snr_db = np.array([[0, n_frames]], dtype=np.int64), None
+        if report is not None:
+            report["frames"] = n_frames
+            report["speech_frames"] = int((segments[:, 1] - segments[:, 0]).sum())
+        return segments, snr_db
+
+    def _clean_spectrogram(self, S, rms, sr=22050, report=None, snr_db=None):
+        """Débruite le spectrogramme des features (ignoré si le SNR est suffisant)"""
+        try:
+            return spectral_gate.apply(S, rms, sr=sr, report=report, snr_db=snr_db)
         except Exception as e:
             print(f"[AI] Warning nettoyage: {e}")
-            return file_path
+            return S, rms
 
-    def extract_features(self, file_path, sr=22050, n_mfcc=40, max_len=300):
+    def extract_features(self, y, sr=22050, max_len=300, report=None, segments=None, snr_db=None):
+        """
+        Matrice (T, 54) sur tout l'enregistrement (au moins max_len trames), ou
+        sur les seules trames des segments de parole s'ils sont fournis.
+        report (optionnel) reçoit le temps de chaque étape et la décision de débruitage.
+        """
         try:
-            y, _ = librosa.load(file_path, sr=sr)
             if y is None or len(y) < 2048:
-                return np.zeros((max_len, 54))
+                return np.zeros((max_len, N_FEATURES), dtype=np.float32)
+            # Un seul spectrogramme, débruité en place puis partagé par MFCC / chroma / RMS
+            frames = segment_frames(segments) if segments is not None else None
             with warnings.catch_warnings():
                 warnings.simplefilter("ignore")
-                mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=n_mfcc).T
-                chroma = librosa.feature.chroma_stft(y=y, sr=sr).T
-                zcr = librosa.feature.zero_crossing_rate(y).T
-                rms = librosa.feature.rms(y=y).T
-            min_l = min(len(mfccs), len(chroma), len(zcr), len(rms))
-            combined = np.hstack([mfccs[:min_l], chroma[:min_l], zcr[:min_l], rms[:min_l]])
+                with timed(report, "stft"):
+                    S, rms = feature_engine.power_spectrogram(np.asarray(y, dtype=np.float32), frames)
+                with timed(report, "denoise"):
+                    S, rms = self._clean_spectrogram(S, rms, sr=sr, report=report, snr_db=snr_db)
+                with timed(report, "features"):
+                    combined = feature_engine.compute(y, sr=sr, spectrogram=(S, rms), frame_indices=frames)
             if combined.shape[0] < max_len:
                 pad_width = max_len - combined.shape[0]
                 combined = np.pad(combined, ((0, pad_width), (0, 0)), mode='constant')
-            else:
-                combined = combined[:max_len]
             return combined
         except Exception as e:
             print(f"[AI] Erreur extraction: {e}")
-            return np.zeros((max_len, 54))
+            return np.zeros((max_len, N_FEATURES), dtype=np.float32)
+
+    def _prepare_audio(self, source, sr=22050, encoding=None, report=None):
+        """Pipeline DSP complet : décodage unique -> VAD -> STFT -> débruitage -> features.
+        source : chemin ou octets audio.
+        Retourne (features des zones de parole, durée en ms, segments de parole),
+        la durée étant déduite du nombre d'échantillons. Sans parole, features est vide."""
+        with timed(report, "decode"):
+            y = self._load_audio(source, sr=sr, encoding=encoding)
+        duration = len(y) / sr * 1000
+        with timed(report, "vad"):
+            segments, snr_db = self._detect_speech(y, sr=sr, report=report)
+        if not len(segments):
+            return np.zeros((0, N_FEATURES), dtype=np.float32), duration, segments
+        features = self.extract_features(
+            y, sr=sr, max_len=settings.analysis_window_frames,
+            report=report, segments=segments, snr_db=snr_db,
+        )
+        return features, duration, segments
+
+    async def _prepare_scaled(self, source, audio_hash=None, encoding=None, report=None):
+        """
+        Features normalisées (T, 54) des zones de parole, durée en ms et segments.
+        Relues depuis le stockage de features si ce contenu a déjà été traité,
+        sinon calculées (pool de processus si configuré) puis stockées.
+        """
+        store_key = feature_store.key(audio_hash, encoding) if audio_hash and feature_store.enabled else None
+        if store_key:
+            stored = await asyncio.to_thread(feature_store.load, store_key)
+            if stored is not None:
+                if report is not None:
+                    report["source"] = "feature_store"
+                return stored
+
+        # Rapport DSP (étapes, VAD, débruitage) rempli dans le dict de l'appelant
+        report = {} if report is None else report
+        if dsp_pool.running:
+            scaled, duration, segments = await dsp_pool.run(source, encoding, report)
+        else:
+            loop = asyncio.get_running_loop()
+            features, duration, segments = await loop.run_in_executor(
+                None, self._prepare_audio, source, SAMPLE_RATE, encoding, report
+            )
+            pipeline_stats.record(report)
+            scaled = self._scale(features, inplace=True)
+
+        if store_key:
+            await asyncio.to_thread(feature_store.save, store_key, scaled, duration, segments)
+        return scaled, duration, segments
+
+    def _scale(self, features, inplace=False):
+        """
+        Normalise la matrice complète en float32 avec les constantes précompilées.
+        inplace : la matrice (float32, possédée par l'appelant) est modifiée
+        directement, sinon une copie float32 est normalisée.
+        """
+        scaled = features if inplace else np.array(features, dtype=np.float32)
+
+        # --- SCALING MANUEL (INFAILLIBLE) ---
+        if len(MEAN_VALUES) > 0 and len(SCALE_VALUES) > 0:
+            # (X - Mean) / Scale
+            try:
+                np.subtract(scaled, _MEAN, out=scaled)
+                np.divide(scaled, _SCALE, out=scaled)
+            except Exception as e:
+                print(f"Erreur maths: {e}")
+        # ------------------------------------
+        return scaled
+
+    def _windows(self, scaled):
+        """
+        Découpe la matrice normalisée en fenêtres glissantes (vue numpy, aucune
+        copie par fenêtre).
+        Retourne (fenêtres (N, window, 54), trame de début de chaque fenêtre).
+        """
+        window = settings.analysis_window_frames
+        hop = settings.analysis_hop_frames
+        n_frames = scaled.shape[0]
+
+        # Complète la fin (trames nulles normalisées) pour que la dernière
+        # fenêtre couvre la fin de l'appel
+        n_windows = 1 + max(0, -(-(n_frames - window) // hop))
+        padded_len = window + (n_windows - 1) * hop
+        if padded_len > n_frames:
+            padding = np.broadcast_to(_SCALED_ZERO, (padded_len - n_frames, scaled.shape[1]))
+            scaled = np.concatenate([scaled, padding])
+
+        windows = np.lib.stride_tricks.sliding_window_view(scaled, (window, scaled.shape[1]))[::hop, 0]
+        return windows, np.arange(n_windows) * hop
+
+    def _label(self, probs):
+        """(émotion applicative, confiance) pour un vecteur de probabilités"""
+        idx = np.argmax(probs)
+        raw_emotion_label = EMOTION_LABELS[idx] if idx < len(EMOTION_LABELS) else "neutral"
+        app_emotion = APP_MAPPING.get(raw_emotion_label, "calm")
 
-    async def analyze_audio_file(self, file_path: str):
+        raw_confidence = float(np.max(probs)) * 100
+        confidence = raw_confidence if raw_confidence >= CONFIDENCE_THRESHOLD else 55.0
+        return app_emotion, confidence
+
+    async def analyze_audio_file(self, source, audio_hash: str = None, encoding: str = None, report: dict = None):
+        """
+        Analyse complète d'un audio (chemin ou octets en mémoire).
+        encoding : "mulaw" / "alaw" pour du G.711 brut sans en-tête.
+        Si audio_hash (sha256 des octets) est fourni,
+        un résultat déjà calculé pour ce contenu est renvoyé sans décodage.
+        report["source"] : "cache", "feature_store" ou "dsp" (étapes réellement exécutées).
+        """
         if not self.tf_available or self.model is None:
             return self._get_error_result("Modèle manquant")
 
-        clean_file_path = None
-        try:
-            loop = asyncio.get_event_loop()
-            clean_file_path = await loop.run_in_executor(None, self._clean_audio, file_path)
-            features = await loop.run_in_executor(None, self.extract_features, clean_file_path)
+        cache_key = None
+        if audio_hash:
+            cache_key = result_cache.key(
+                audio_hash, self.model_version,
+                f"{pipeline_fingerprint()}:{encoding or 'auto'}",
+            )
+            cached = await result_cache.get(cache_key)
+            if cached is not None:
+                if report is not None:
+                    report["source"] = "cache"
+                return cached
 
-            features_flat = features.reshape(-1, features.shape[-1])
-            
-            # --- SCALING MANUEL (INFAILLIBLE) ---
-            if len(MEAN_VALUES) > 0 and len(SCALE_VALUES) > 0:
-                # (X - Mean) / Scale
-                try:
-                    mean_vec = np.array(MEAN_VALUES)
-                    scale_vec = np.array(SCALE_VALUES)
-                    features_scaled = (features_flat - mean_vec) / scale_vec
-                except Exception as e:
-                     print(f"Erreur maths: {e}")
-                     features_scaled = features_flat
-            else:
-                features_scaled = features_flat
-            # ------------------------------------
-
-            X = features_scaled.reshape(1, features.shape[0], features.shape[1])
-            predictions = await loop.run_in_executor(None, lambda: self.model.predict(X))
-            probs = predictions[0]  
-
-            idx = np.argmax(probs)
-            raw_emotion_label = EMOTION_LABELS[idx] if idx < len(EMOTION_LABELS) else "neutral"
-            app_emotion = APP_MAPPING.get(raw_emotion_label, "calm")
-            
-            raw_confidence = float(np.max(probs)) * 100
-            confidence = raw_confidence if raw_confidence >= CONFIDENCE_THRESHOLD else 55.0
-            
-            stats = self._calculate_stats(probs)
-            duration = librosa.get_duration(filename=clean_file_path) * 1000
-
-            return {
-                "dominant_emotion": app_emotion,
-                "client_emotions": [
-                    {"emotion": app_emotion, "confidence": confidence, "timestamp": 0},
-                    {"emotion": app_emotion, "confidence": confidence, "timestamp": duration}
-                ],
-                "agent_emotions": [],
-                "stats": stats,
-                "duration": duration
-            }
+        if report is not None:
+            report["source"] = "dsp"
+        result = await self._analyze(source, audio_hash, encoding, report)
+        if cache_key and "error" not in result:
+            await result_cache.put(cache_key, result)
+        return result
+
+    async def analyze_realtime_chunk(self, call_id: str, audio, timestamp: float = 0.0, encoding: str = None):
+        """
+        Ajoute un chunk temps réel (octets audio, ou échantillons float32 à
+        22050 Hz) au flux de l'appel (features incrémentales). L'émotion est
+        prédite au prochain tick, groupée avec les autres appels actifs.
+        """
+        if isinstance(audio, (bytes, bytearray, memoryview)):
+            audio = await asyncio.to_thread(self._load_audio, bytes(audio), SAMPLE_RATE, encoding)
+        await realtime_inference.push(call_id, audio, timestamp)
+
+    async def rescore(self, store_key: str):
+        """Re-score un enregistrement à partir du stockage de features (clé feature_store.key, sans DSP)"""
+        if not self.tf_available or self.model is None:
+            return self._get_error_result("Modèle manquant")
+        stored = await asyncio.to_thread(feature_store.load, store_key)
+        if stored is None:
+            return self._get_error_result("Features introuvables")
+        try:
+            return await self._score(*stored)
+        except Exception as e:
+            return self._get_error_result(str(e))
 
+    async def _analyze(self, source, audio_hash: str = None, encoding: str = None, report: dict = None):
+        try:
+            scaled, duration, segments = await self._prepare_scaled(source, audio_hash, encoding, report)
+            return await self._score(scaled, duration, segments)
         except Exception as e:
             import traceback
             traceback.print_exc()
             return self._get_error_result(str(e))
-        finally:
-            if clean_file_path and clean_file_path != file_path and os.path.exists(clean_file_path):
-                try: os.remove(clean_file_path)
-                except: pass
+
+    async def _score(self, scaled, duration, segments):
+        """
+        Inférence sur toutes les fenêtres des zones de parole puis construction
+        du résultat. Sans parole, le modèle n'est pas appelé.
+        """
+        if not len(segments):
+            return self._no_speech_result(duration)
+        X, starts = self._windows(scaled)
+
+        # Toutes les fenêtres de l'appel passent dans un seul predict
+        predictions = await inference_scheduler.predict(X)
+
+        # Trame de début de chaque fenêtre, replacée dans l'enregistrement d'origine
+        frames = segment_frames(segments)
+        starts = frames[np.minimum(starts, len(frames) - 1)]
+        frame_ms = HOP_LENGTH / SAMPLE_RATE * 1000
+        timeline = []
+        for start, probs in zip(starts, predictions):
+            emotion, confidence = self._label(probs)
+            timeline.append({
+                "emotion": emotion,
+                "confidence": confidence,
+                "timestamp": min(float(start) * frame_ms, duration)
+            })
+        # Point final à la durée totale (utilisé par le frontend comme fin de timeline)
+        timeline.append({**timeline[-1], "timestamp": duration})
+
+        mean_probs = predictions.mean(axis=0)
+        app_emotion, _ = self._label(mean_probs)
+        stats = self._calculate_stats(mean_probs)
+
+        return {
+            "dominant_emotion": app_emotion,
+            "client_emotions": timeline,
+            "agent_emotions": [],
+            "stats": stats,
+            "duration": duration
+        }
 
     def _calculate_stats(self, probs):
         stats = {
@@ -171,6 +397,15 @@ class EmotionAIService:
                         stats[key] += round(float(score) * 100)
         return stats
 
+    def _no_speech_result(self, duration):
+        return {
+            "dominant_emotion": "calm",
+            "client_emotions": [], "agent_emotions": [],
+            "stats": {"average_confidence": 0},
+            "no_speech": True,
+            "duration": duration
+        }
+
     def _get_error_result(self, error_msg):
         return {
             "dominant_emotion": "calm",
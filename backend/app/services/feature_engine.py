@@ -0,0 +1,172 @@
+import functools
+import numpy as np
+import librosa
+import scipy.fft
+
+# Paramètres d'extraction (identiques aux valeurs par défaut de librosa utilisées
+# lors de l'entraînement de speech_emotion_model.keras)
+SAMPLE_RATE = 22050
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MELS = 128
+N_MFCC = 40
+N_CHROMA = 12
+N_FEATURES = N_MFCC + N_CHROMA + 2  # 40 MFCC + 12 chroma + ZCR + RMS = 54
+
+# À incrémenter dès que les features (ou leur normalisation MEAN/SCALE) changent :
+# invalide les entrées du stockage persistant de features
+FEATURE_EXTRACTOR_VERSION = "3"
+
+# Nombre de trames traitées par bloc de FFT (borne la mémoire temporaire complexe)
+FRAMES_PER_BLOCK = 1024
+
+
+@functools.lru_cache(maxsize=None)
+def _fft_window(n_fft):
+    return librosa.filters.get_window("hann", n_fft, fftbins=True).reshape(-1, 1)
+
+
+@functools.lru_cache(maxsize=None)
+def _mel_basis(sr, n_fft, n_mels):
+    return librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels)
+
+
+@functools.lru_cache(maxsize=None)
+def _chroma_basis(sr, n_fft, n_chroma, tuning):
+    # tuning est quantifié à 0.01 par librosa : au plus ~100 bancs par sr
+    return librosa.filters.chroma(sr=sr, n_fft=n_fft, tuning=tuning, n_chroma=n_chroma)
+
+
+class FeatureEngine:
+    """
+    Calcule les 54 features par trame (MFCC, chroma, ZCR, RMS) à partir
+    d'un unique spectrogramme de puissance.
+    Reproduit la disposition de librosa.feature.mfcc / chroma_stft /
+    zero_crossing_rate / rms avec leurs paramètres par défaut.
+    """
+
+    def __init__(self, n_fft=N_FFT, hop_length=HOP_LENGTH, n_mels=N_MELS,
+                 n_mfcc=N_MFCC, n_chroma=N_CHROMA):
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.n_mels = n_mels
+        self.n_mfcc = n_mfcc
+        self.n_chroma = n_chroma
+
+    def n_frames(self, n_samples):
+        """Nombre de trames produites pour un signal de n_samples (center=True)"""
+        return 1 + n_samples // self.hop_length
+
+    def power_spectrogram(self, y, frame_indices=None):
+        """
+        STFT centrée (padding à zéro) calculée par blocs.
+        Retourne (S, rms) : S puissance float32 (1 + n_fft/2, T), rms (T,)
+        calculé sur les mêmes trames temporelles.
+        frame_indices : ne calcule que ces trames (ex. segments de parole).
+        """
+        pad = self.n_fft // 2
+        y_pad = np.pad(y, (pad, pad), mode="constant")
+        frames = librosa.util.frame(y_pad, frame_length=self.n_fft, hop_length=self.hop_length)
+        n_frames = frames.shape[1] if frame_indices is None else len(frame_indices)
+        S = np.empty((1 + self.n_fft // 2, n_frames), dtype=np.float32)
+        rms = np.empty(n_frames, dtype=np.float32)
+        for start in range(0, n_frames, FRAMES_PER_BLOCK):
+            stop = min(start + FRAMES_PER_BLOCK, n_frames)
+            if frame_indices is None:
+                block = frames[:, start:stop]
+            else:
+                block = frames[:, frame_indices[start:stop]]
+            S[:, start:stop], rms[start:stop] = self.frame_spectrum(block)
+        return S, rms
+
+    def frame_spectrum(self, block):
+        """(puissance (1 + n_fft/2, k), rms (k,)) d'un bloc de trames (n_fft, k)"""
+        spec = scipy.fft.rfft(_fft_window(self.n_fft) * block, axis=0)
+        return spec.real ** 2 + spec.imag ** 2, np.sqrt(np.mean(np.abs(block) ** 2, axis=0))
+
+    def zero_crossing_rate(self, y, frame_indices=None):
+        """ZCR par trame via somme cumulée des passages par zéro (padding 'edge')"""
+        pad = self.n_fft // 2
+        y_pad = np.pad(y, (pad, pad), mode="edge")
+        if frame_indices is None:
+            frame_indices = np.arange(self.n_frames(len(y)))
+        return self.zero_crossings(y_pad, np.asarray(frame_indices) * self.hop_length)
+
+    def zero_crossings(self, y_pad, starts):
+        """ZCR des trames de y_pad (signal déjà paddé) commençant aux indices starts"""
+        signs = np.signbit(np.where(np.abs(y_pad) <= 1e-10, 0, y_pad))
+        crossings = np.empty(len(y_pad), dtype=np.int64)
+        crossings[0] = 0
+        np.not_equal(signs[1:], signs[:-1], out=crossings[1:])
+        cumsum = np.concatenate(([0], np.cumsum(crossings)))
+        # Le premier échantillon de chaque trame ne compte pas (pad=False dans librosa)
+        counts = cumsum[starts + self.n_fft] - cumsum[starts + 1]
+        return counts / self.n_fft
+
+    def pitch_peaks(self, S, sr):
+        """Pics de piptrack (fréquences, magnitudes) trame par trame, par blocs"""
+        pitches, mags = [], []
+        for start in range(0, S.shape[1], FRAMES_PER_BLOCK):
+            pitch, mag = librosa.piptrack(S=S[:, start:start + FRAMES_PER_BLOCK], sr=sr, n_fft=self.n_fft)
+            mask = pitch > 0
+            pitches.append(pitch[mask])
+            mags.append(mag[mask])
+        return np.concatenate(pitches), np.concatenate(mags)
+
+    def tuning(self, pitch, mag):
+        """Accord estimé à partir des pics de pitch (comme librosa.estimate_tuning)"""
+        threshold = np.median(mag) if len(mag) else 0.0
+        return librosa.pitch_tuning(pitch[mag >= threshold], bins_per_octave=self.n_chroma)
+
+    def estimate_tuning(self, S, sr):
+        """Équivalent de librosa.estimate_tuning(S=S), calculé par blocs de trames"""
+        return self.tuning(*self.pitch_peaks(S, sr))
+
+    def log_mel(self, S, sr):
+        """Spectrogramme mel en dB, avant le plancher top_db (trame par trame)"""
+        mel = _mel_basis(sr, self.n_fft, self.n_mels) @ S
+        return 10.0 * np.log10(np.maximum(1e-10, mel))
+
+    def mfcc_from_log_mel(self, log_spec):
+        """Plancher à 80 dB sous le maximum de la matrice, puis DCT"""
+        log_spec = np.maximum(log_spec, log_spec.max() - 80.0)
+        return scipy.fft.dct(log_spec, axis=0, type=2, norm="ortho")[:self.n_mfcc]
+
+    def mfcc(self, S, sr):
+        return self.mfcc_from_log_mel(self.log_mel(S, sr))
+
+    def chroma_projection(self, S, sr, tuning):
+        """Énergie par classe de hauteur, avant normalisation (trame par trame)"""
+        return _chroma_basis(sr, self.n_fft, self.n_chroma, tuning) @ S
+
+    def normalize_chroma(self, raw):
+        norm = raw.max(axis=0)
+        norm[norm < np.finfo(raw.dtype).tiny] = 1.0
+        return raw / norm
+
+    def chroma(self, S, sr):
+        return self.normalize_chroma(self.chroma_projection(S, sr, self.estimate_tuning(S, sr)))
+
+    def assemble(self, mfcc, chroma, zcr, rms):
+        """Matrice (T, 54) : [40 MFCC | 12 chroma | ZCR | RMS]"""
+        features = np.empty((len(rms), N_FEATURES), dtype=np.float32)
+        features[:, :self.n_mfcc] = mfcc.T
+        features[:, self.n_mfcc:self.n_mfcc + self.n_chroma] = chroma.T
+        features[:, -2] = zcr
+        features[:, -1] = rms
+        return features
+
+    def compute(self, y, sr=SAMPLE_RATE, spectrogram=None, frame_indices=None):
+        """
+        Matrice (T, 54) : [40 MFCC | 12 chroma | ZCR | RMS]
+        spectrogram : (S, rms) déjà calculés (et éventuellement débruités) pour y
+        frame_indices : trames retenues (une ligne par trame, dans cet ordre)
+        """
+        y = np.asarray(y, dtype=np.float32)
+        if spectrogram is None:
+            spectrogram = self.power_spectrogram(y, frame_indices)
+        S, rms = spectrogram
+        return self.assemble(self.mfcc(S, sr), self.chroma(S, sr), self.zero_crossing_rate(y, frame_indices), rms)
+
+
+feature_engine = FeatureEngine()
@@ -0,0 +1,163 @@
+"""
+Stockage persistant des features normalisées, par enregistrement.
+
+Chaque entrée est un .npy (T, 54) lisible en mémoire mappée + un .json de
+métadonnées, rangés sous
+<dir>/<version extracteur>-<empreinte DSP_SETTINGS>/<hash[:2]>/<hash>[.<encodage G.711>].
+Un nouveau modèle peut ainsi re-scorer l'archive sans refaire le DSP :
+
+    python -m app.services.feature_store ingest --audio-dir ./archive
+    python -m app.services.feature_store rescore --output rescored.jsonl
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from app.config import settings
+from app.services.feature_engine import FEATURE_EXTRACTOR_VERSION
+
+
+# Réglages qui modifient les features et segments stockés (rééchantillonnage,
+# longueur max, VAD, débruitage) : un répertoire par combinaison
+DSP_SETTINGS = (
+    "resample_quality",
+    "analysis_window_frames",
+    "vad_enabled", "vad_energy_margin_db", "vad_min_energy_db", "vad_max_zcr",
+    "vad_min_speech_ms", "vad_hangover_ms",
+    "denoise_snr_threshold_db", "denoise_prop_decrease",
+)
+
+
+def settings_fingerprint(names) -> str:
+    """Empreinte courte des valeurs courantes des réglages names"""
+    values = ":".join(f"{name}={getattr(settings, name)!r}" for name in names)
+    return hashlib.sha256(values.encode()).hexdigest()[:16]
+
+
+class FeatureStore:
+    def __init__(self, root_dir: str, version: str):
+        self.root_dir = root_dir
+        self.version = version
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.root_dir)
+
+    @staticmethod
+    def key(audio_hash: str, encoding: str = None) -> str:
+        """Clé d'une entrée : les mêmes octets lus en mulaw ou alaw donnent d'autres features"""
+        return audio_hash if encoding is None else f"{audio_hash}.{encoding}"
+
+    def _base(self, key: str) -> str:
+        return os.path.join(self.root_dir, self.version, key[:2], key)
+
+    def load(self, key: str):
+        """(features mappées en lecture seule, durée en ms, segments de parole) ou None"""
+        base = self._base(key)
+        try:
+            with open(base + ".json") as f:
+                meta = json.load(f)
+            features = np.load(base + ".npy", mmap_mode="r")
+        except (FileNotFoundError, ValueError):
+            return None
+        segments = np.array(meta["segments"], dtype=np.int64).reshape(-1, 2)
+        return features, meta["duration"], segments
+
+    def save(self, key: str, features, duration: float, segments):
+        base = self._base(key)
+        if os.path.exists(base + ".npy"):
+            return
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        tmp = f"{base}.{os.getpid()}.tmp"
+        with open(tmp + ".json", "w") as f:
+            json.dump({
+                "duration": duration,
+                "n_frames": len(features),
+                "segments": np.asarray(segments).tolist(),
+            }, f)
+        os.replace(tmp + ".json", base + ".json")
+        # Le .npy est écrit en dernier : sa présence marque une entrée complète
+        with open(tmp + ".npy", "wb") as f:
+            np.save(f, np.ascontiguousarray(features, dtype=np.float32))
+        os.replace(tmp + ".npy", base + ".npy")
+
+    def keys(self):
+        """Itère sur les clés stockées pour la version courante de l'extracteur"""
+        root = os.path.join(self.root_dir, self.version)
+        if not os.path.isdir(root):
+            return
+        for prefix in sorted(os.listdir(root)):
+            for name in sorted(os.listdir(os.path.join(root, prefix))):
+                if name.endswith(".npy") and not name.endswith(".tmp.npy"):
+                    yield name[:-4]
+
+
+# Instance globale
+feature_store = FeatureStore(
+    settings.feature_store_dir, f"{FEATURE_EXTRACTOR_VERSION}-{settings_fingerprint(DSP_SETTINGS)}"
+)
+
+
+def file_sha256(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+async def _ingest(audio_dir):
+    from app.services.emotion_ai_service import emotion_service
+    from app.services.audio_decoder import g711_encoding_for
+    for name in sorted(os.listdir(audio_dir)):
+        path = os.path.join(audio_dir, name)
+        audio_hash = file_sha256(path)
+        encoding = g711_encoding_for(name)
+        if feature_store.load(feature_store.key(audio_hash, encoding)) is not None:
+            continue
+        try:
+            await emotion_service._prepare_scaled(path, audio_hash, encoding)
+            print(f"[{name}] {audio_hash[:12]} stocké")
+        except Exception as e:
+            print(f"[{name}] ignoré : {e}")
+
+
+async def _rescore(output_path, concurrency):
+    from app.services.emotion_ai_service import emotion_service
+    await emotion_service.initialize()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def score(key):
+        async with semaphore:
+            return key, await emotion_service.rescore(key)
+
+    # Les appels concurrents partagent les batches du scheduler d'inférence
+    results = await asyncio.gather(*[score(key) for key in feature_store.keys()])
+    with open(output_path, "w") as f:
+        for key, result in results:
+            audio_hash, _, encoding = key.partition(".")
+            f.write(json.dumps({"audio_hash": audio_hash, "encoding": encoding or None, **result}) + "\n")
+    print(f"{len(results)} enregistrements re-scorés -> {output_path}")
+    await emotion_service.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stockage des features normalisées")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ingest = sub.add_parser("ingest", help="Extraire et stocker les features d'un dossier audio")
+    ingest.add_argument("--audio-dir", required=True)
+    rescore = sub.add_parser("rescore", help="Re-scorer toutes les entrées avec le modèle courant")
+    rescore.add_argument("--output", default="rescored.jsonl")
+    rescore.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    if not feature_store.enabled:
+        parser.error("FEATURE_STORE_DIR n'est pas configuré")
+    if args.command == "ingest":
+        asyncio.run(_ingest(args.audio_dir))
+    else:
+        asyncio.run(_rescore(args.output, args.concurrency))
@@ -0,0 +1,243 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+
+class InferenceBackend:
+    """
+    Interface commune des runtimes d'inférence.
+    load() prépare le modèle (conversion + cache de l'artefact si besoin),
+    predict(X) prend un batch (N, 300, 54) et retourne les probabilités (N, 7).
+    """
+
+    name = "base"
+    extension = None
+
+    def __init__(self, source_path: str, artifact_path: str = None, quantization: str = "none"):
+        # source_path : modèle Keras de référence ; artifact_path : modèle converti
+        self.source_path = source_path
+        self.artifact_path = artifact_path
+        # none | float16 | int8 (quantification post-entraînement)
+        self.quantization = quantization
+
+    def load(self):
+        raise NotImplementedError
+
+    def predict(self, X) -> np.ndarray:
+        raise NotImplementedError
+
+    def _artifact_is_stale(self) -> bool:
+        """L'artefact converti manque ou est plus ancien que le modèle Keras"""
+        if not os.path.exists(self.artifact_path):
+            return True
+        return (
+            os.path.exists(self.source_path)
+            and os.path.getmtime(self.source_path) > os.path.getmtime(self.artifact_path)
+        )
+
+    def _ensure_artifact(self):
+        """Convertit le modèle Keras au premier démarrage puis réutilise le fichier"""
+        if not self._artifact_is_stale():
+            return
+        if not os.path.exists(self.source_path):
+            raise FileNotFoundError(f"Modèle introuvable au chemin : {self.source_path}")
+        print(f" Conversion {self.name} : {self.source_path} -> {self.artifact_path}")
+        os.makedirs(os.path.dirname(os.path.abspath(self.artifact_path)), exist_ok=True)
+
+        # Écriture atomique : un fichier partiel ne doit jamais être pris pour le cache
+        fd, tmp_path = tempfile.mkstemp(
+            suffix=self.extension, dir=os.path.dirname(os.path.abspath(self.artifact_path))
+        )
+        os.close(fd)
+        try:
+            self._convert(tmp_path)
+            os.replace(tmp_path, self.artifact_path)
+            os.chmod(self.artifact_path, 0o644)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _convert(self, output_path: str):
+        raise NotImplementedError
+
+    def _validate_quantized(self):
+        """Refuse un modèle quantifié sous le seuil d'accord (après chargement)"""
+        if self.quantization != "none":
+            from app.services.quantization import validate_backend
+            validate_backend(self)
+
+    def _load_keras_source(self):
+        import tensorflow as tf
+        return tf.keras.models.load_model(self.source_path)
+
+    def _load_convertible_model(self):
+        """
+        Copie du modèle Keras avec les couches récurrentes déroulées (unroll=True) :
+        le LSTM bidirectionnel est alors exporté en ops simples au lieu de
+        TensorList, que TFLite (builtins) et ONNX ne savent pas exécuter.
+        """
+        model = self._load_keras_source()
+        config = model.get_config()
+
+        def unroll(node):
+            if isinstance(node, dict):
+                if node.get("class_name") in ("LSTM", "GRU", "SimpleRNN"):
+                    node["config"]["unroll"] = True
+                for value in node.values():
+                    unroll(value)
+            elif isinstance(node, list):
+                for value in node:
+                    unroll(value)
+
+        unroll(config)
+        unrolled = model.__class__.from_config(config)
+        unrolled.set_weights(model.get_weights())
+        return unrolled
+
+
+class KerasBackend(InferenceBackend):
+    """TensorFlow / Keras complet (référence)"""
+
+    name = "keras"
+
+    def load(self):
+        if not os.path.exists(self.source_path):
+            raise FileNotFoundError(f"Modèle introuvable au chemin : {self.source_path}")
+        self.model = self._load_keras_source()
+
+    def predict(self, X) -> np.ndarray:
+        return self.model.predict(X, batch_size=max(len(X), 1), verbose=0)
+
+
+class TFLiteBackend(InferenceBackend):
+    """Interpréteur TFLite (tflite_runtime si installé, sinon tf.lite)"""
+
+    name = "tflite"
+    extension = ".tflite"
+
+    def _convert(self, output_path: str):
+        import tensorflow as tf
+        model = self._load_convertible_model()
+        saved_model_dir = tempfile.mkdtemp()
+        try:
+            model.export(saved_model_dir)
+            converter = tf.lite.TFLiteConverter.from_saved_model(saved_model_dir)
+            if self.quantization != "none":
+                # int8 : poids quantifiés (dynamic range) ; float16 : poids en demi-précision
+                converter.optimizations = [tf.lite.Optimize.DEFAULT]
+                if self.quantization == "float16":
+                    converter.target_spec.supported_types = [tf.float16]
+            tflite_model = converter.convert()
+        finally:
+            shutil.rmtree(saved_model_dir, ignore_errors=True)
+        with open(output_path, "wb") as f:
+            f.write(tflite_model)
+
+    def load(self):
+        self._ensure_artifact()
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+        self.interpreter = Interpreter(model_path=self.artifact_path)
+        self.input_index = self.interpreter.get_input_details()[0]["index"]
+        self.output_index = self.interpreter.get_output_details()[0]["index"]
+        self.input_shape = None
+        self._validate_quantized()
+
+    def predict(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32)
+        # Redimensionne l'entrée seulement quand la taille du batch change
+        if self.input_shape != X.shape:
+            self.interpreter.resize_tensor_input(self.input_index, X.shape)
+            self.interpreter.allocate_tensors()
+            self.input_shape = X.shape
+        self.interpreter.set_tensor(self.input_index, X)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output_index)
+
+
+class ONNXBackend(InferenceBackend):
+    """ONNX Runtime (CPU)"""
+
+    name = "onnx"
+    extension = ".onnx"
+
+    def _convert(self, output_path: str):
+        import tensorflow as tf
+        import tf2onnx
+        model = self._load_convertible_model()
+        spec = (tf.TensorSpec((None,) + tuple(model.input_shape[1:]), tf.float32, name="input"),)
+
+        @tf.function(input_signature=spec)
+        def serve(x):
+            return model(x, training=False)
+
+        if self.quantization == "none":
+            tf2onnx.convert.from_function(serve, input_signature=spec, output_path=output_path)
+            return
+
+        # int8 : quantification dynamique des poids à partir du graphe flottant
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        float_path = output_path + ".float.onnx"
+        try:
+            tf2onnx.convert.from_function(serve, input_signature=spec, output_path=float_path)
+            quantize_dynamic(float_path, output_path, weight_type=QuantType.QInt8)
+        finally:
+            if os.path.exists(float_path):
+                os.remove(float_path)
+
+    def load(self):
+        self._ensure_artifact()
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            self.artifact_path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+        self._validate_quantized()
+
+    def predict(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32)
+        return self.session.run(None, {self.input_name: X})[0]
+
+
+# "local" est la valeur historique de EMOTION_MODEL_TYPE (= Keras)
+BACKENDS = {
+    "keras": KerasBackend,
+    "local": KerasBackend,
+    "tflite": TFLiteBackend,
+    "onnx": ONNXBackend,
+}
+
+
+# Quantifications supportées par runtime
+QUANTIZATIONS = {
+    "tflite": ("none", "float16", "int8"),
+    "onnx": ("none", "int8"),
+}
+
+
+def create_backend(model_type: str, source_path: str, artifact_path: str,
+                   quantization: str = "none") -> InferenceBackend:
+    """Instancie le backend choisi par EMOTION_MODEL_TYPE / EMOTION_MODEL_PATH /
+    EMOTION_MODEL_QUANTIZATION"""
+    backend_cls = BACKENDS.get((model_type or "").lower())
+    if backend_cls is None:
+        print(f" Type de modèle inconnu '{model_type}', utilisation de Keras")
+        backend_cls = KerasBackend
+
+    quantization = (quantization or "none").lower()
+    if quantization not in QUANTIZATIONS.get(backend_cls.name, ("none",)):
+        raise ValueError(f"Quantification '{quantization}' non supportée par {backend_cls.name}")
+
+    if backend_cls.extension:
+        # L'extension du chemin configuré suit le runtime choisi (et la quantification)
+        root, _ = os.path.splitext(artifact_path)
+        suffix = "" if quantization == "none" else f".{quantization}"
+        artifact_path = root + suffix + backend_cls.extension
+    return backend_cls(source_path, artifact_path, quantization)
@@ -0,0 +1,117 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app.config import settings
+
+
+class InferenceScheduler:
+    """
+    Micro-batching dynamique partagé par toutes les requêtes.
+    Les tenseurs d'entrée sont mis en file ; un batch part dès qu'il atteint
+    max_batch_size lignes ou que max_wait_ms est écoulé depuis la première
+    entrée. Chaque appelant récupère sa propre tranche des prédictions.
+    Un seul thread appelle le modèle.
+    """
+
+    def __init__(self, max_batch_size: int, max_wait_ms: float, max_queue_depth: int):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue_depth = max_queue_depth
+        self.predict_fn = None
+        self.queue = None
+        self.worker = None
+        self.executor = None
+        # Compteurs exposés pour le suivi
+        self.batches = 0
+        self.rows = 0
+
+    async def start(self, predict_fn):
+        """Démarre la boucle de batching (appelé au démarrage du service d'IA)"""
+        if self.worker is not None:
+            return
+        self.predict_fn = predict_fn
+        self.queue = asyncio.Queue(maxsize=self.max_queue_depth)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        self.worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.worker is None:
+            return
+        self.worker.cancel()
+        try:
+            await self.worker
+        except asyncio.CancelledError:
+            pass
+        self.worker = None
+        self.executor.shutdown(wait=False)
+
+    @property
+    def running(self) -> bool:
+        return self.worker is not None
+
+    async def predict(self, X) -> np.ndarray:
+        """Met X (n, ...) en file et attend ses n lignes de prédictions"""
+        future = asyncio.get_running_loop().create_future()
+        # Attend si la file est pleine (back-pressure sur les appelants)
+        await self.queue.put((X, future))
+        return await future
+
+    async def _collect(self):
+        """Attend une première entrée puis accumule jusqu'à la taille max ou l'échéance"""
+        items = [await self.queue.get()]
+        n_rows = len(items[0][0])
+        deadline = time.monotonic() + self.max_wait
+
+        while n_rows < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.queue.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            items.append(item)
+            n_rows += len(item[0])
+        return items
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = await self._collect()
+            # Ignore les appelants partis entre-temps (requête annulée)
+            items = [(X, future) for X, future in items if not future.done()]
+            if not items:
+                continue
+
+            sizes = [len(X) for X, _ in items]
+            # Fenêtres (vues) matérialisées une seule fois, en float32 contigu
+            batch = (
+                np.ascontiguousarray(items[0][0], dtype=np.float32) if len(items) == 1
+                else np.concatenate([X for X, _ in items], dtype=np.float32)
+            )
+            try:
+                predictions = await loop.run_in_executor(self.executor, self.predict_fn, batch)
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.rows += len(batch)
+            offset = 0
+            for (_, future), size in zip(items, sizes):
+                if not future.done():
+                    future.set_result(predictions[offset:offset + size])
+                offset += size
+
+
+# Instance globale
+inference_scheduler = InferenceScheduler(
+    max_batch_size=settings.inference_max_batch_size,
+    max_wait_ms=settings.inference_max_wait_ms,
+    max_queue_depth=settings.inference_queue_depth,
+)
@@ -0,0 +1,258 @@
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from app.config import settings
+from app.services.audio_decoder import audio_duration_ms
+
+
+FINISHED = ("done", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    filename TEXT,
+    audio_path TEXT,
+    audio_hash TEXT,
+    encoding TEXT,
+    duration_ms REAL,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+"""
+
+
+class JobQueue:
+    """
+    File persistante de jobs d'analyse (SQLite + fichiers audio sur disque).
+    Un pool de workers asyncio traite les jobs dans l'ordre d'arrivée ; les
+    jobs interrompus (arrêt, crash) sont remis en attente au démarrage.
+    """
+
+    def __init__(self, root_dir: str, workers: int, default_rtf: float, retention_hours: int):
+        self.root_dir = root_dir
+        self.workers = max(1, workers)
+        self.retention_hours = retention_hours
+        # Temps de traitement / durée audio (moyenne glissante des jobs terminés)
+        self.rtf = default_rtf
+
+        self.db = None
+        self.db_lock = threading.Lock()
+        self.wakeup = asyncio.Event()
+        self.tasks = []
+        self.waiters = {}  # job_id -> futures en attente de la fin du job
+
+    @property
+    def audio_dir(self) -> str:
+        return os.path.join(self.root_dir, "audio")
+
+    # --- SQLite (appelé via asyncio.to_thread) ---
+
+    def _open(self):
+        os.makedirs(self.audio_dir, exist_ok=True)
+        self.db = sqlite3.connect(
+            os.path.join(self.root_dir, "jobs.db"), check_same_thread=False, isolation_level=None
+        )
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(_SCHEMA)
+        # Jobs interrompus pendant leur analyse : remis en attente
+        self.db.execute("UPDATE jobs SET status = 'queued', started_at = NULL WHERE status = 'running'")
+        return self.db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def _query(self, sql, params=()):
+        with self.db_lock:
+            return self.db.execute(sql, params).fetchall()
+
+    def _claim(self):
+        """Passe le plus ancien job en attente à 'running' (atomique)"""
+        rows = self._query(
+            "UPDATE jobs SET status = 'running', started_at = ? "
+            "WHERE id = (SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1) "
+            "RETURNING id, audio_path, audio_hash, encoding, duration_ms",
+            (datetime.utcnow().isoformat(),),
+        )
+        return dict(rows[0]) if rows else None
+
+    def _ahead(self, created_at=None):
+        """(nombre de jobs, durée audio totale en ms) en attente ou en cours avant created_at"""
+        sql = "SELECT COUNT(*), COALESCE(SUM(duration_ms), 0) FROM jobs WHERE status IN ('queued', 'running')"
+        params = ()
+        if created_at is not None:
+            sql += " AND created_at < ?"
+            params = (created_at,)
+        count, total = self._query(sql, params)[0]
+        return count, total
+
+    def _store_audio(self, upload, path):
+        if upload.data is not None:
+            with open(path, "wb") as f:
+                f.write(upload.data)
+        else:
+            shutil.move(upload.path, path)
+
+    def _purge(self):
+        limit = (datetime.utcnow() - timedelta(hours=self.retention_hours)).isoformat()
+        self._query("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?", (limit,))
+
+    # --- Cycle de vie ---
+
+    async def start(self):
+        if self.tasks:
+            return
+        queued = await asyncio.to_thread(self._open)
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self.wakeup.set()
+        print(f" Job queue ready ({self.workers} workers, {queued} jobs en attente)")
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    # --- API ---
+
+    def _eta_seconds(self, ahead_ms, duration_ms) -> float:
+        # Les jobs devant sont répartis sur les workers, puis ce job est traité
+        return round((ahead_ms / self.workers + duration_ms) * self.rtf / 1000, 1)
+
+    async def submit(self, upload, encoding: str = None) -> dict:
+        """Enregistre l'audio reçu et crée le job ; retourne l'id et l'ETA"""
+        job_id = uuid.uuid4().hex
+        ext = os.path.splitext(upload.path)[1]
+        path = os.path.join(self.audio_dir, job_id + ext)
+        await asyncio.to_thread(self._store_audio, upload, path)
+        duration = await asyncio.to_thread(audio_duration_ms, path, encoding)
+
+        ahead_count, ahead_ms = await asyncio.to_thread(self._ahead)
+        await asyncio.to_thread(
+            self._query,
+            "INSERT INTO jobs (id, status, filename, audio_path, audio_hash, encoding, duration_ms, created_at) "
+            "VALUES (?, 'queued', ?, ?, ?, ?, ?, ?)",
+            (job_id, upload.filename, path, upload.sha256, encoding, duration, datetime.utcnow().isoformat()),
+        )
+        self.wakeup.set()
+        return {
+            "job_id": job_id,
+            "status": "queued",
+            "duration": duration,
+            "queue_position": ahead_count,
+            "eta_seconds": self._eta_seconds(ahead_ms, duration),
+        }
+
+    async def get(self, job_id: str):
+        rows = await asyncio.to_thread(self._query, "SELECT * FROM jobs WHERE id = ?", (job_id,))
+        if not rows:
+            return None
+        row = dict(rows[0])
+        job = {
+            "job_id": row["id"],
+            "status": row["status"],
+            "filename": row["filename"],
+            "duration": row["duration_ms"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+        }
+        if row["status"] == "queued":
+            ahead_count, ahead_ms = await asyncio.to_thread(self._ahead, row["created_at"])
+            job["queue_position"] = ahead_count
+            job["eta_seconds"] = self._eta_seconds(ahead_ms, row["duration_ms"] or 0)
+        elif row["status"] in FINISHED:
+            job["result"] = json.loads(row["result"]) if row["result"] else None
+            job["error"] = row["error"]
+        return job
+
+    async def wait(self, job_id: str):
+        """Attend la fin du job (retour immédiat s'il est déjà terminé ou inconnu)"""
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.setdefault(job_id, set()).add(future)
+        try:
+            job = await self.get(job_id)
+            if job is None or job["status"] in FINISHED:
+                return job
+            return await future
+        finally:
+            waiters = self.waiters.get(job_id)
+            if waiters is not None:
+                waiters.discard(future)
+                if not waiters:
+                    del self.waiters[job_id]
+
+    # --- Workers ---
+
+    async def _worker(self):
+        while True:
+            self.wakeup.clear()
+            job = await asyncio.to_thread(self._claim)
+            if job is None:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=60)
+                except asyncio.TimeoutError:
+                    await asyncio.to_thread(self._purge)
+                continue
+            await self._run(job)
+
+    async def _run(self, job):
+        from app.services.emotion_ai_service import emotion_service
+
+        start = time.perf_counter()
+        report = {}
+        try:
+            result = await emotion_service.analyze_audio_file(
+                job["audio_path"], audio_hash=job["audio_hash"], encoding=job["encoding"], report=report
+            )
+        except Exception as e:
+            result = emotion_service._get_error_result(str(e))
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        status = "failed" if "error" in result else "done"
+        await asyncio.to_thread(
+            self._query,
+            "UPDATE jobs SET status = ?, finished_at = ?, result = ?, error = ? WHERE id = ?",
+            (status, datetime.utcnow().isoformat(), json.dumps(result), result.get("error"), job["id"]),
+        )
+        try:
+            os.remove(job["audio_path"])
+        except OSError:
+            pass
+
+        # Seuls les jobs passés par le DSP et l'inférence mesurent le RTF
+        # (un résultat en cache, en ~0 ms, rendrait les ETA trop optimistes)
+        if job["duration_ms"] and report.get("source") == "dsp" and status == "done":
+            self.rtf = 0.8 * self.rtf + 0.2 * (elapsed_ms / job["duration_ms"])
+        print(f"[Jobs] {job['id'][:8]} {status} en {elapsed_ms / 1000:.1f}s")
+
+        waiters = self.waiters.get(job["id"])
+        if waiters:
+            finished = await self.get(job["id"])
+            for future in waiters:
+                if not future.done():
+                    future.set_result(finished)
+
+    def stats(self) -> dict:
+        return {"workers": self.workers, "rtf": round(self.rtf, 4), "waiting_clients": len(self.waiters)}
+
+
+# Instance globale
+job_queue = JobQueue(
+    root_dir=settings.job_store_dir,
+    workers=settings.job_workers,
+    default_rtf=settings.job_default_rtf,
+    retention_hours=settings.job_retention_hours,
+)
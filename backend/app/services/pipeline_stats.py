@@ -0,0 +1,70 @@
+import time
+from contextlib import contextmanager
+
+
+@contextmanager
+def timed(report, stage: str):
+    """Mesure la durée (ms) d'une étape du pipeline DSP dans report["stages"]"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if report is not None:
+            report.setdefault("stages", {})[stage] = (time.perf_counter() - start) * 1000
+
+
+class PipelineStats:
+    """
+    Temps par étape DSP (décodage, VAD, STFT, débruitage, features), part de
+    parole retenue par la VAD et taux de débruitage ignoré
+    """
+
+    def __init__(self):
+        self.files = 0
+        self.stage_ms = {}  # étape -> (nombre, total ms)
+        self.denoise_applied = 0
+        self.denoise_skipped = 0
+        self.frames = 0
+        self.speech_frames = 0
+        self.no_speech = 0
+
+    def record(self, report):
+        """Ajoute le rapport d'un fichier (rempli par EmotionAIService._prepare_audio)"""
+        if not report:
+            return
+        self.files += 1
+        for stage, ms in report.get("stages", {}).items():
+            count, total = self.stage_ms.get(stage, (0, 0.0))
+            self.stage_ms[stage] = (count + 1, total + ms)
+        if "frames" in report:
+            self.frames += report["frames"]
+            self.speech_frames += report["speech_frames"]
+            self.no_speech += report["speech_frames"] == 0
+        if "denoised" in report:
+            if report["denoised"]:
+                self.denoise_applied += 1
+            else:
+                self.denoise_skipped += 1
+
+    def stats(self):
+        checked = self.denoise_applied + self.denoise_skipped
+        return {
+            "files": self.files,
+            "stages": {
+                stage: {"mean_ms": round(total / count, 2), "total_ms": round(total, 1)}
+                for stage, (count, total) in self.stage_ms.items()
+            },
+            "vad": {
+                "speech_ratio": round(self.speech_frames / self.frames, 3) if self.frames else 0.0,
+                "no_speech_files": self.no_speech,
+            },
+            "denoise": {
+                "applied": self.denoise_applied,
+                "skipped": self.denoise_skipped,
+                "skip_rate": round(self.denoise_skipped / checked, 3) if checked else 0.0,
+            },
+        }
+
+
+# Instance globale
+pipeline_stats = PipelineStats()
@@ -0,0 +1,209 @@
+"""
+Validation des modèles quantifiés (post-training int8 / float16).
+
+Usage :
+    # 1. Construire le jeu fixe de tenseurs de features (normalisés) à partir d'audios
+    python -m app.services.quantization build --audio-dir ./samples
+
+    # 2. Comparer les variantes (accord top-1 après APP_MAPPING, latence, mémoire)
+    python -m app.services.quantization report
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from app.config import settings
+
+
+class QuantizationRejected(ValueError):
+    """Le modèle quantifié est en dessous du seuil d'accord configuré"""
+
+
+# Variantes comparées par le rapport : (type de modèle, quantification)
+VARIANTS = [
+    ("keras", "none"),
+    ("tflite", "none"),
+    ("tflite", "float16"),
+    ("tflite", "int8"),
+    ("onnx", "none"),
+    ("onnx", "int8"),
+]
+
+
+def app_labels(probs) -> np.ndarray:
+    """Top-1 de chaque ligne, exprimé dans les émotions de l'application"""
+    from app.services.emotion_ai_service import EMOTION_LABELS, APP_MAPPING
+    labels = np.array([APP_MAPPING[label] for label in EMOTION_LABELS])
+    return labels[np.argmax(probs, axis=-1)]
+
+
+def agreement(reference_probs, candidate_probs) -> float:
+    """Proportion de fenêtres dont l'émotion applicative est identique"""
+    return float(np.mean(app_labels(reference_probs) == app_labels(candidate_probs)))
+
+
+def load_features(path=None) -> np.ndarray:
+    path = path or settings.emotion_calibration_features
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Jeu de features de calibration introuvable : {path}")
+    return np.load(path, mmap_mode="r")
+
+
+def predict_in_batches(backend, X, batch_size=None) -> np.ndarray:
+    batch_size = batch_size or settings.inference_max_batch_size
+    return np.concatenate([
+        backend.predict(np.asarray(X[i:i + batch_size]))
+        for i in range(0, len(X), batch_size)
+    ])
+
+
+# ============================================
+# RAPPORT DE VALIDATION (stocké à côté de l'artefact)
+# ============================================
+
+def _sha256(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _report_path(backend) -> str:
+    return backend.artifact_path + ".report.json"
+
+
+def validate_backend(backend):
+    """
+    Vérifie un backend quantifié déjà chargé contre le modèle Keras flottant.
+    Le résultat est mis en cache (lié au hash de l'artefact) : la comparaison
+    complète n'a lieu qu'après une nouvelle conversion.
+    """
+    from app.services.inference_backends import KerasBackend
+
+    artifact_hash = _sha256(backend.artifact_path)
+    report = None
+    if os.path.exists(_report_path(backend)):
+        with open(_report_path(backend)) as f:
+            report = json.load(f)
+        if report.get("artifact_sha256") != artifact_hash:
+            report = None
+
+    if report is None:
+        X = load_features()
+        reference = KerasBackend(backend.source_path)
+        reference.load()
+        report = {
+            "artifact_sha256": artifact_hash,
+            "quantization": backend.quantization,
+            "n_windows": len(X),
+            "agreement": agreement(predict_in_batches(reference, X), predict_in_batches(backend, X)),
+        }
+        with open(_report_path(backend), "w") as f:
+            json.dump(report, f, indent=2)
+
+    print(f" Accord top-1 {backend.name}/{backend.quantization} : {report['agreement']:.1%}")
+    if report["agreement"] < settings.emotion_quantized_min_agreement:
+        raise QuantizationRejected(
+            f"Modèle {backend.quantization} refusé : accord {report['agreement']:.1%} "
+            f"< {settings.emotion_quantized_min_agreement:.1%}"
+        )
+
+
+# ============================================
+# HARNAIS DE COMPARAISON
+# ============================================
+
+def _measure(model_type, quantization, features_path, batch_size, repeats):
+    """Exécuté dans un processus neuf pour isoler la mémoire de chaque variante"""
+    from app.services.emotion_ai_service import emotion_service
+    from app.services.inference_backends import create_backend
+
+    backend = create_backend(model_type, emotion_service.model_path, settings.emotion_model_path, quantization)
+    backend.load()
+    X = load_features(features_path)
+
+    probs = predict_in_batches(backend, X, batch_size)
+    batch = np.asarray(X[:batch_size])
+    start = time.perf_counter()
+    for _ in range(repeats):
+        backend.predict(batch)
+    latency_ms = (time.perf_counter() - start) / repeats * 1000
+
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return probs, latency_ms, peak_mb
+
+
+def run_report(features_path=None, batch_size=None, repeats=20):
+    features_path = features_path or settings.emotion_calibration_features
+    batch_size = batch_size or settings.inference_max_batch_size
+    results = {}
+    for model_type, quantization in VARIANTS:
+        with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn")) as pool:
+            try:
+                results[(model_type, quantization)] = pool.submit(
+                    _measure, model_type, quantization, features_path, batch_size, repeats
+                ).result()
+            except Exception as e:
+                print(f"[{model_type}/{quantization}] indisponible : {e}")
+
+    reference = results.get(("keras", "none"))
+    if reference is None:
+        print("Référence Keras indisponible, accord non calculé")
+    print(f"{'variante':<16}{'accord top-1':>14}{'latence/batch':>16}{'mémoire pic':>14}")
+    for (model_type, quantization), (probs, latency_ms, peak_mb) in results.items():
+        agree = f"{agreement(reference[0], probs):.1%}" if reference else "-"
+        print(f"{model_type + '/' + quantization:<16}{agree:>14}{latency_ms:>13.1f} ms{peak_mb:>11.0f} MB")
+    return results
+
+
+def build_features(audio_dir, output_path=None, max_windows=2000):
+    """Construit le jeu fixe de tenseurs normalisés (N, 300, 54) à partir d'audios"""
+    from app.services.emotion_ai_service import emotion_service
+
+    output_path = output_path or settings.emotion_calibration_features
+    windows = []
+    for name in sorted(os.listdir(audio_dir)):
+        try:
+            features, _, segments = emotion_service._prepare_audio(os.path.join(audio_dir, name))
+        except Exception as e:
+            print(f"[{name}] ignoré : {e}")
+            continue
+        if not len(segments):
+            print(f"[{name}] ignoré : aucune parole")
+            continue
+        X, _ = emotion_service._windows(emotion_service._scale(features))
+        windows.append(np.asarray(X, dtype=np.float32))
+    if not windows:
+        raise ValueError(f"Aucun audio exploitable dans {audio_dir}")
+
+    X = np.concatenate(windows)[:max_windows]
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    np.save(output_path, X)
+    print(f"{len(X)} fenêtres enregistrées dans {output_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validation des modèles quantifiés")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Construire le jeu de features de calibration")
+    build.add_argument("--audio-dir", required=True)
+    build.add_argument("--output", default=None)
+    build.add_argument("--max-windows", type=int, default=2000)
+    report = sub.add_parser("report", help="Comparer les variantes du modèle")
+    report.add_argument("--features", default=None)
+    report.add_argument("--batch-size", type=int, default=None)
+    report.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_features(args.audio_dir, args.output, args.max_windows)
+    else:
+        run_report(args.features, args.batch_size, args.repeats)
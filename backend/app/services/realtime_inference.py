@@ -0,0 +1,187 @@
+import asyncio
+import time
+
+import numpy as np
+
+from app.config import settings
+from app.services.feature_engine import HOP_LENGTH, SAMPLE_RATE
+from app.services.inference_scheduler import inference_scheduler
+from app.services.streaming_features import StreamingFeatureExtractor
+from app.services.voice_activity import voice_activity
+
+
+class CallStream:
+    """Flux temps réel d'un appel : features incrémentales + dernier timestamp client"""
+
+    def __init__(self, capacity: int):
+        self.extractor = StreamingFeatureExtractor(capacity)
+        self.timestamp = 0.0
+        self.updated = time.monotonic()
+
+
+class RealtimeInference:
+    """
+    Inférence temps réel groupée sur tous les appels actifs.
+    Chaque appel garde les features incrémentales d'une fenêtre de modèle
+    (chaque trame n'est calculée qu'une fois, à la réception de l'audio) ; à
+    chaque tick, les appels ayant reçu assez d'audio nouveau sont traités
+    ensemble : fenêtres assemblées en un seul passage dans l'exécuteur, puis
+    un seul predict pour toutes. Chaque résultat est transmis à
+    on_result(call_id, EmotionData, secondes d'audio nouveau couvertes).
+    Les flux sans audio depuis idle_s sont libérés ; en fin d'appel, finish()
+    calcule les dernières trames et score la fenêtre finale.
+    """
+
+    def __init__(self, tick_ms: float, min_audio_s: float, min_new_audio_s: float, idle_s: float):
+        self.tick = tick_ms / 1000
+        self.capacity = settings.analysis_window_frames
+        self.min_frames = int(min_audio_s * SAMPLE_RATE / HOP_LENGTH)
+        self.min_new_frames = int(min_new_audio_s * SAMPLE_RATE / HOP_LENGTH)
+        self.idle_s = idle_s
+
+        self.streams = {}  # call_id -> CallStream
+        self.on_result = None
+        self.worker = None
+
+        self.ticks = 0
+        self.predicted = 0
+        self.tick_ms_total = 0.0
+
+    async def start(self, on_result):
+        if self.worker is not None:
+            return
+        self.on_result = on_result
+        self.worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.worker is None:
+            return
+        self.worker.cancel()
+        try:
+            await self.worker
+        except asyncio.CancelledError:
+            pass
+        self.worker = None
+
+    async def push(self, call_id: str, y, timestamp: float):
+        """
+        Ajoute l'audio (float32 à SAMPLE_RATE) au flux de l'appel : seules les
+        nouvelles trames sont calculées. La prédiction est faite à un prochain
+        tick et publiée via on_result.
+        """
+        stream = self.streams.get(call_id)
+        if stream is None:
+            stream = self.streams[call_id] = CallStream(self.capacity)
+        stream.timestamp = timestamp
+        stream.updated = time.monotonic()
+        await asyncio.to_thread(stream.extractor.push, y)
+
+    async def finish(self, call_id: str):
+        """
+        Fin d'appel : libère le flux après avoir calculé ses dernières trames
+        (flush) et publié, s'il reste de l'audio non scoré, l'émotion de la
+        fenêtre finale.
+        """
+        stream = self.streams.pop(call_id, None)
+        if stream is None:
+            return
+        extractor = stream.extractor
+        await asyncio.to_thread(extractor.flush)
+        if extractor.frames < self.min_frames or not extractor.new_frames:
+            return
+        new_audio_s = extractor.take_new_frames() * HOP_LENGTH / SAMPLE_RATE
+        try:
+            emotion, = await self._score([(extractor, stream.timestamp)])
+            if emotion is not None and self.on_result is not None:
+                await self.on_result(call_id, emotion, new_audio_s)
+        except Exception as e:
+            print(f"[Realtime] Erreur fenêtre finale {call_id}: {e}")
+
+    def _ready(self):
+        """(call_id, extracteur, timestamp, secondes d'audio nouveau) des appels à traiter à ce tick"""
+        ready = []
+        idle_before = time.monotonic() - self.idle_s
+        for call_id, stream in list(self.streams.items()):
+            extractor = stream.extractor
+            if stream.updated < idle_before:
+                del self.streams[call_id]
+            elif extractor.frames >= self.min_frames and extractor.new_frames >= self.min_new_frames:
+                new_audio_s = extractor.take_new_frames() * HOP_LENGTH / SAMPLE_RATE
+                ready.append((call_id, extractor, stream.timestamp, new_audio_s))
+        return ready
+
+    def _windows(self, extractors):
+        """Fenêtre normalisée (window, 54) par appel, None sans parole (exécuteur)"""
+        from app.services.emotion_ai_service import emotion_service
+
+        windows = []
+        for extractor in extractors:
+            segments, snr_db = voice_activity.classify(*extractor.levels(), sr=SAMPLE_RATE)
+            if not len(segments):
+                windows.append(None)
+                continue
+            scaled = emotion_service._scale(extractor.window(snr_db), inplace=True)
+            windows.append(emotion_service._windows(scaled)[0][0])
+        return windows
+
+    async def _score(self, items):
+        """EmotionData (None sans parole) de chaque (extracteur, timestamp), un seul predict"""
+        from app.models.schemas import EmotionData
+        from app.services.emotion_ai_service import emotion_service
+
+        loop = asyncio.get_running_loop()
+        windows = await loop.run_in_executor(None, self._windows, [extractor for extractor, _ in items])
+        speech = [i for i, window in enumerate(windows) if window is not None]
+        results = [None] * len(items)
+        if speech:
+            predictions = await inference_scheduler.predict(np.stack([windows[i] for i in speech]))
+            for i, probs in zip(speech, predictions):
+                emotion, confidence = emotion_service._label(probs)
+                results[i] = EmotionData(emotion=emotion, confidence=confidence, timestamp=items[i][1])
+            self.predicted += len(speech)
+        return results
+
+    async def _tick(self):
+        ready = self._ready()
+        if not ready:
+            return
+        try:
+            # Un seul predict pour toutes les fenêtres du tick
+            results = await self._score([(extractor, timestamp) for _, extractor, timestamp, _ in ready])
+        except Exception as e:
+            print(f"[Realtime] Erreur tick: {e}")
+            return
+
+        for (call_id, _, _, new_audio_s), emotion in zip(ready, results):
+            if emotion is None or self.on_result is None:
+                continue
+            try:
+                await self.on_result(call_id, emotion, new_audio_s)
+            except Exception as e:
+                print(f"[Realtime] Erreur mise à jour {call_id}: {e}")
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await self._tick()
+            elapsed = time.perf_counter() - start
+            self.ticks += 1
+            self.tick_ms_total += elapsed * 1000
+            await asyncio.sleep(max(0.0, self.tick - elapsed))
+
+    def stats(self) -> dict:
+        return {
+            "active_calls": len(self.streams),
+            "ticks": self.ticks,
+            "predicted_windows": self.predicted,
+            "mean_tick_ms": round(self.tick_ms_total / self.ticks, 2) if self.ticks else 0.0,
+        }
+
+
+# Instance globale
+realtime_inference = RealtimeInference(
+    tick_ms=settings.realtime_tick_ms,
+    min_audio_s=settings.realtime_min_audio_s,
+    min_new_audio_s=settings.realtime_min_new_audio_s,
+    idle_s=settings.realtime_idle_s,
+)
@@ -1,160 +1,214 @@
-import asyncio
-from typing import Dict, Set
+from typing import Dict
 from fastapi import WebSocket
 import json
-from datetime import datetime
 
 from app.models.schemas import EmotionData, WebSocketMessage, EmotionType
 from app.services.emotion_ai_service import emotion_service
+from app.services.realtime_inference import realtime_inference
+from app.services.call_state import CallState
+from app.services.ws_outbox import Outbox
+from app.services.team_publisher import team_publisher
+from app.services.audio_protocol import AgentAudioSession
+from app.config import settings
 
 class ConnectionManager:
     """Gestionnaire de connexions WebSocket pour le temps réel"""
     
     def __init__(self):
-        # Connexions des superviseurs par team_id
-        self.supervisor_connections: Dict[str, Set[WebSocket]] = {}
+        # Connexions des superviseurs par team_id (file sortante par connexion)
+        self.supervisor_connections: Dict[str, Dict[WebSocket, Outbox]] = {}
         # Connexions des agents par agent_id
-        self.agent_connections: Dict[str, WebSocket] = {}
-        # État des appels actifs
-        self.active_calls: Dict[str, dict] = {}
-        # Alertes actives
-        self.active_alerts: Dict[str, int] = {}  # call_id -> durée en secondes
+        self.agent_connections: Dict[str, Outbox] = {}
+        # État du protocole binaire de chaque connexion agent
+        self.agent_sessions: Dict[str, AgentAudioSession] = {}
+        # État des appels actifs (taille bornée, historique en anneau)
+        self.active_calls: Dict[str, CallState] = {}
+        # Index des appels actifs : par équipe (team_id -> call_id -> appel)
+        # et par agent (agent_id -> call_id), tenus à jour au début et à la fin
+        self.team_calls: Dict[str, Dict[str, CallState]] = {}
+        self.agent_calls: Dict[str, str] = {}
     
-    async def connect_supervisor(self, websocket: WebSocket, team_id: str):
-        """Connecter un superviseur"""
+    def _outbox(self, websocket: WebSocket, on_close) -> Outbox:
+        return Outbox(websocket, settings.ws_outbox_size, settings.ws_send_timeout_s, on_close)
+    
+    async def connect_supervisor(self, websocket: WebSocket, team_id: str) -> Outbox:
+        """
+        Connecter un superviseur. L'état initial des appels de l'équipe est
+        mis en file avant tout autre message ; tous les envois de la
+        connexion passent ensuite par la file retournée.
+        """
         await websocket.accept()
         if team_id not in self.supervisor_connections:
-            self.supervisor_connections[team_id] = set()
-        self.supervisor_connections[team_id].add(websocket)
+            self.supervisor_connections[team_id] = {}
+        outbox = self.supervisor_connections[team_id][websocket] = self._outbox(
+            websocket, lambda outbox: self.disconnect_supervisor(websocket, team_id)
+        )
+        outbox.put(json.dumps({
+            "type": "initial_state",
+            "data": {"calls": self.get_active_calls_for_team(team_id)}
+        }))
+        return outbox
     
-    async def connect_agent(self, websocket: WebSocket, agent_id: str):
-        """Connecter un agent"""
+    async def connect_agent(self, websocket: WebSocket, agent_id: str, session: AgentAudioSession = None) -> Outbox:
+        """
+        Connecter un agent (session : état du protocole binaire de la connexion).
+        Tous les envois de la connexion passent par la file retournée.
+        """
         await websocket.accept()
-        self.agent_connections[agent_id] = websocket
+        previous = self.agent_connections.get(agent_id)
+        if previous is not None:
+            previous.close()
+        outbox = self.agent_connections[agent_id] = self._outbox(
+            websocket, lambda outbox: self.disconnect_agent(agent_id, websocket)
+        )
+        if session is not None:
+            self.agent_sessions[agent_id] = session
+        return outbox
     
     def disconnect_supervisor(self, websocket: WebSocket, team_id: str):
         """Déconnecter un superviseur"""
-        if team_id in self.supervisor_connections:
-            self.supervisor_connections[team_id].discard(websocket)
+        connections = self.supervisor_connections.get(team_id)
+        if connections is None:
+            return
+        outbox = connections.pop(websocket, None)
+        if not connections:
+            del self.supervisor_connections[team_id]
+        if outbox is not None:
+            outbox.close()
+    
+    def disconnect_agent(self, agent_id: str, websocket: WebSocket = None):
+        """Déconnecter un agent (websocket : seulement si c'est encore sa connexion)"""
+        outbox = self.agent_connections.get(agent_id)
+        if outbox is None or (websocket is not None and outbox.websocket is not websocket):
+            return
+        del self.agent_connections[agent_id]
+        self.agent_sessions.pop(agent_id, None)
+        outbox.close()
     
-    def disconnect_agent(self, agent_id: str):
-        """Déconnecter un agent"""
-        if agent_id in self.agent_connections:
-            del self.agent_connections[agent_id]
+    @staticmethod
+    def _coalesce_key(message: WebSocketMessage):
+        """Seul le dernier feedback en attente d'envoi à l'agent est utile"""
+        if message.type == "emotion_feedback":
+            return (message.type,)
+        return None
     
     async def broadcast_to_team(self, team_id: str, message: WebSocketMessage):
-        """Envoyer un message à tous les superviseurs d'une équipe"""
-        if team_id in self.supervisor_connections:
-            message_json = message.model_dump_json()
-            for connection in self.supervisor_connections[team_id]:
-                try:
-                    await connection.send_text(message_json)
-                except Exception:
-                    pass
+        """
+        Envoyer un message à tous les superviseurs d'une équipe : sérialisé une
+        fois, mis dans la file de chaque connexion sans attendre les envois
+        """
+        if self.supervisor_connections.get(team_id):
+            self.publish_to_team(team_id, message.model_dump_json(), self._coalesce_key(message))
+    
+    def publish_to_team(self, team_id: str, message_json: str, key=None, merge=None):
+        """Message déjà sérialisé mis dans la file de chaque superviseur de l'équipe"""
+        connections = self.supervisor_connections.get(team_id)
+        if connections:
+            for outbox in list(connections.values()):
+                outbox.put(message_json, key, merge)
     
     async def send_to_agent(self, agent_id: str, message: WebSocketMessage):
         """Envoyer un message à un agent spécifique"""
-        if agent_id in self.agent_connections:
-            try:
-                await self.agent_connections[agent_id].send_text(
-                    message.model_dump_json()
-                )
-            except Exception:
-                pass
+        outbox = self.agent_connections.get(agent_id)
+        if outbox is not None:
+            outbox.put(message.model_dump_json(), self._coalesce_key(message))
     
     async def start_call(self, call_id: str, agent_id: str, agent_name: str, team_id: str):
-        """Démarrer un nouvel appel"""
-        self.active_calls[call_id] = {
-            "id": call_id,
-            "agent_id": agent_id,
-            "agent_name": agent_name,
-            "team_id": team_id,
-            "start_time": datetime.utcnow().isoformat(),
-            "current_emotion": EmotionData(
-                emotion=EmotionType.CALM,
-                confidence=80,
-                timestamp=0
-            ).model_dump(),
-            "emotion_history": [],
-            "alert_triggered": False,
-            "alert_duration": 0
-        }
+        """Démarrer un nouvel appel (un seul appel actif par agent)"""
+        previous = self.agent_calls.get(agent_id)
+        if previous is not None:
+            print(f"[Calls] Agent {agent_id} : appel {previous} terminé par un nouvel appel")
+            await self.end_call(previous)
+        
+        call = CallState(call_id, agent_id, agent_name, team_id, settings.realtime_history_size)
+        self.active_calls[call_id] = call
+        self.team_calls.setdefault(team_id, {})[call_id] = call
+        self.agent_calls[agent_id] = call_id
         
         await self.broadcast_to_team(team_id, WebSocketMessage(
             type="call_started",
-            data=self.active_calls[call_id]
+            data=call.to_dict()
         ))
     
     async def end_call(self, call_id: str):
-        """Terminer un appel"""
-        if call_id in self.active_calls:
-            call = self.active_calls[call_id]
-            await self.broadcast_to_team(call["team_id"], WebSocketMessage(
+        """Terminer un appel (la fenêtre audio finale est scorée avant la fin)"""
+        await realtime_inference.finish(call_id)
+        call = self.active_calls.pop(call_id, None)
+        if call is not None:
+            team = self.team_calls.get(call.team_id)
+            if team is not None:
+                team.pop(call_id, None)
+                if not team:
+                    del self.team_calls[call.team_id]
+            if self.agent_calls.get(call.agent_id) == call_id:
+                del self.agent_calls[call.agent_id]
+            session = self.agent_sessions.get(call.agent_id)
+            if session is not None:
+                session.end_call(call_id)
+            team_publisher.forget(call_id, call.team_id)
+            # État final inclus : la dernière mise à jour en attente n'est pas publiée
+            await self.broadcast_to_team(call.team_id, WebSocketMessage(
                 type="call_ended",
-                data={"call_id": call_id}
+                data={
+                    "call_id": call_id,
+                    "emotion": call.current_emotion(),
+                    "alert_triggered": call.alert_triggered,
+                    "alert_duration": call.alert_duration
+                }
             ))
-            del self.active_calls[call_id]
-            
-        if call_id in self.active_alerts:
-            del self.active_alerts[call_id]
     
     async def update_emotion(
         self, 
         call_id: str, 
-        emotion_data: EmotionData
+        emotion_data: EmotionData,
+        audio_s: float
     ):
-        """Mettre à jour l'émotion d'un appel"""
-        if call_id not in self.active_calls:
+        """Mettre à jour l'émotion d'un appel (audio_s : secondes d'audio nouveau couvertes)"""
+        call = self.active_calls.get(call_id)
+        if call is None:
             return
         
-        call = self.active_calls[call_id]
-        call["current_emotion"] = emotion_data.model_dump()
-        call["emotion_history"].append(emotion_data.model_dump())
+        call.set_emotion(emotion_data.emotion, emotion_data.confidence, emotion_data.timestamp)
         
         # Vérifier les alertes (émotions négatives > 30s)
         is_negative = emotion_data.emotion in [EmotionType.ANGER, EmotionType.ANXIETY]
         
         if is_negative:
-            if call_id not in self.active_alerts:
-                self.active_alerts[call_id] = 0
-            self.active_alerts[call_id] += 3  # +3 secondes par chunk
+            call.alert_duration += audio_s
             
-            if self.active_alerts[call_id] >= 30 and not call["alert_triggered"]:
-                call["alert_triggered"] = True
-                await self.broadcast_to_team(call["team_id"], WebSocketMessage(
+            if call.alert_duration >= 30 and not call.alert_triggered:
+                call.alert_triggered = True
+                await self.broadcast_to_team(call.team_id, WebSocketMessage(
                     type="alert",
                     data={
                         "call_id": call_id,
-                        "agent_id": call["agent_id"],
-                        "agent_name": call["agent_name"],
+                        "agent_id": call.agent_id,
+                        "agent_name": call.agent_name,
                         "emotion": emotion_data.emotion,
-                        "duration": self.active_alerts[call_id]
+                        "duration": call.alert_duration
                     }
                 ))
         else:
             # Reset l'alerte si l'émotion redevient positive
-            if call_id in self.active_alerts:
-                self.active_alerts[call_id] = max(0, self.active_alerts[call_id] - 3)
-        
-        call["alert_duration"] = self.active_alerts.get(call_id, 0)
+            call.alert_duration = max(0, call.alert_duration - audio_s)
         
-        # Broadcast la mise à jour
-        await self.broadcast_to_team(call["team_id"], WebSocketMessage(
-            type="emotion_update",
-            data={
-                "call_id": call_id,
-                "emotion": emotion_data.model_dump(),
-                "alert_triggered": call["alert_triggered"],
-                "alert_duration": call["alert_duration"]
-            }
-        ))
+        # Mise à jour publiée au prochain tick, groupée avec celles de l'équipe
+        # (message emotion_updates) ; les alertes restent immédiates
+        team_publisher.publish(call.team_id, call_id, {
+            "call_id": call_id,
+            "emotion": call.current_emotion(),
+            "alert_triggered": call.alert_triggered,
+            "alert_duration": call.alert_duration
+        })
     
     def get_active_calls_for_team(self, team_id: str) -> list:
-        """Récupérer tous les appels actifs d'une équipe"""
-        return [
-            call for call in self.active_calls.values()
-            if call["team_id"] == team_id
-        ]
+        """Récupérer tous les appels actifs d'une équipe (index par équipe)"""
+        return [call.to_dict() for call in self.team_calls.get(team_id, {}).values()]
+    
+    def get_call_for_agent(self, agent_id: str):
+        """Appel actif d'un agent (None s'il n'en a pas)"""
+        call_id = self.agent_calls.get(agent_id)
+        return self.active_calls.get(call_id) if call_id is not None else None
 
 
 # Instance globale
@@ -163,16 +217,25 @@ manager = ConnectionManager()
 
 async def process_realtime_audio(
     call_id: str,
-    audio_data: bytes,
+    audio_data,
     timestamp: float
 ):
     """
-    Traiter un chunk audio en temps réel.
-    Appelé depuis le WebSocket ou l'API de streaming.
+    Traiter un chunk audio en temps réel : octets d'un fichier audio (JSON
+    base64) ou échantillons float32 à 22050 Hz (trames binaires).
+    Appelé depuis le WebSocket ou l'API de streaming. L'émotion est publiée
+    au prochain tick d'inférence (publish_realtime_emotion).
     """
-    emotion_data = await emotion_service.analyze_realtime_chunk(audio_data)
-    emotion_data.timestamp = timestamp
-    
-    await manager.update_emotion(call_id, emotion_data)
-    
-    return emotion_data
+    await emotion_service.analyze_realtime_chunk(call_id, audio_data, timestamp)
+
+
+async def publish_realtime_emotion(call_id: str, emotion_data: EmotionData, audio_s: float):
+    """Résultat d'un tick d'inférence : mise à jour de l'appel et feedback à l'agent"""
+    await manager.update_emotion(call_id, emotion_data, audio_s)
+
+    call = manager.active_calls.get(call_id)
+    if call is not None:
+        await manager.send_to_agent(call.agent_id, WebSocketMessage(
+            type="emotion_feedback",
+            data=emotion_data.model_dump()
+        ))
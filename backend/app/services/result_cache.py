@@ -0,0 +1,147 @@
+import asyncio
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+from app.config import settings
+
+
+class ResultCache:
+    """
+    Cache des résultats d'analyse adressé par contenu.
+    Clé = hash des octets audio + version du modèle + version du pipeline.
+    Deux niveaux, chacun borné en taille : LRU en mémoire puis fichiers JSON
+    sur disque (optionnel, éviction des moins récemment utilisés).
+    """
+
+    def __init__(self, max_memory_bytes: int, disk_dir: str = "", max_disk_bytes: int = 0):
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+
+        self.memory = OrderedDict()  # clé -> résultat sérialisé (bytes)
+        self.memory_bytes = 0
+        self.disk_bytes = None  # calculé au premier accès disque
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(audio_hash: str, model_version: str, pipeline_version: str) -> str:
+        return hashlib.sha256(
+            f"{audio_hash}:{model_version}:{pipeline_version}".encode()
+        ).hexdigest()
+
+    async def get(self, key: str):
+        payload = self.memory.get(key)
+        if payload is not None:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            print(f"[Cache] hit mémoire {key[:12]} (hits={self.hits}, misses={self.misses})")
+            return json.loads(payload)
+
+        if self.disk_dir:
+            payload = await asyncio.to_thread(self._read_disk, key)
+            if payload is not None:
+                self._put_memory(key, payload)
+                self.hits += 1
+                self.disk_hits += 1
+                print(f"[Cache] hit disque {key[:12]} (hits={self.hits}, misses={self.misses})")
+                return json.loads(payload)
+
+        self.misses += 1
+        print(f"[Cache] miss {key[:12]} (hits={self.hits}, misses={self.misses})")
+        return None
+
+    async def put(self, key: str, result: dict):
+        payload = json.dumps(result).encode()
+        self._put_memory(key, payload)
+        if self.disk_dir:
+            await asyncio.to_thread(self._write_disk, key, payload)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory_bytes,
+            "disk_bytes": self.disk_bytes or 0,
+        }
+
+    # --- Niveau mémoire ---
+
+    def _put_memory(self, key, payload):
+        if len(payload) > self.max_memory_bytes:
+            return
+        if key in self.memory:
+            self.memory_bytes -= len(self.memory.pop(key))
+        self.memory[key] = payload
+        self.memory_bytes += len(payload)
+        while self.memory_bytes > self.max_memory_bytes:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+
+    # --- Niveau disque (exécuté hors boucle asyncio) ---
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _ensure_disk(self):
+        if self.disk_bytes is None:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self.disk_bytes = sum(
+                entry.stat().st_size for entry in os.scandir(self.disk_dir)
+                if entry.name.endswith(".json")
+            )
+
+    def _read_disk(self, key):
+        self._ensure_disk()
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                payload = f.read()
+            os.utime(path)  # date d'accès utilisée pour l'éviction LRU
+            return payload
+        except FileNotFoundError:
+            return None
+
+    def _write_disk(self, key, payload):
+        self._ensure_disk()
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        self.disk_bytes += len(payload)
+        if self.disk_bytes > self.max_disk_bytes:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        entries = sorted(
+            (entry for entry in os.scandir(self.disk_dir) if entry.name.endswith(".json")),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        for entry in entries:
+            if self.disk_bytes <= self.max_disk_bytes:
+                break
+            size = entry.stat().st_size
+            try:
+                os.remove(entry.path)
+                self.disk_bytes -= size
+            except FileNotFoundError:
+                pass
+
+
+# Instance globale
+result_cache = ResultCache(
+    max_memory_bytes=settings.result_cache_memory_mb * 1024 * 1024,
+    disk_dir=settings.result_cache_dir,
+    max_disk_bytes=settings.result_cache_disk_mb * 1024 * 1024,
+)
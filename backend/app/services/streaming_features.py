@@ -0,0 +1,147 @@
+import threading
+
+import librosa
+import numpy as np
+
+from app.services.feature_engine import feature_engine, SAMPLE_RATE
+from app.services.denoiser import spectral_gate
+
+
+class StreamingFeatureExtractor:
+    """
+    Extraction incrémentale des features d'un flux audio (un extracteur par
+    appel). Chaque trame est calculée une seule fois, dès que ses n_fft
+    échantillons sont reçus : la fin non consommée du signal est conservée
+    d'un chunk à l'autre. Le spectre, le RMS, le ZCR et les pics de pitch des
+    capacity dernières trames sont gardés en anneau.
+    window() applique les étapes qui portent sur toute la fenêtre (plancher
+    top_db des MFCC, accord du chroma) ainsi que les projections mel / chroma,
+    faites sur la fenêtre entière : BLAS ne donne pas les mêmes arrondis
+    colonne par colonne et en bloc. Le résultat est identique à
+    feature_engine.compute(y, frame_indices=...) sur le flux complet et les
+    mêmes trames.
+    """
+
+    def __init__(self, capacity: int, sr=SAMPLE_RATE, engine=feature_engine):
+        self.engine = engine
+        self.sr = sr
+        self.capacity = capacity
+        self.pad = engine.n_fft // 2
+
+        self.S = np.zeros((1 + engine.n_fft // 2, capacity), dtype=np.float32)
+        self.rms = np.zeros(capacity, dtype=np.float32)
+        self.zcr = np.zeros(capacity)
+        self.peaks = [None] * capacity  # (fréquences, magnitudes) piptrack par trame
+
+        self.frames = 0  # trames calculées depuis le début du flux
+        self.new_frames = 0  # depuis le dernier take_new_frames()
+        self.samples = 0
+        self.finished = False
+        # Signal paddé non consommé : à zéro en tête pour la STFT, 'edge' pour
+        # le ZCR ; offset = indice (paddé) de leur premier échantillon
+        self.zero_tail = None
+        self.edge_tail = None
+        self.offset = 0
+        self.lock = threading.Lock()
+
+    def push(self, y) -> int:
+        """Ajoute des échantillons (float32 à sr) ; retourne le nombre de trames calculées"""
+        y = np.asarray(y, dtype=np.float32)
+        if not len(y) or self.finished:
+            return 0
+        with self.lock:
+            if self.zero_tail is None:
+                self.zero_tail = np.concatenate([np.zeros(self.pad, dtype=np.float32), y])
+                self.edge_tail = np.concatenate([np.full(self.pad, y[0], dtype=np.float32), y])
+            else:
+                self.zero_tail = np.concatenate([self.zero_tail, y])
+                self.edge_tail = np.concatenate([self.edge_tail, y])
+            self.samples += len(y)
+            available = self.pad + self.samples - self.engine.n_fft
+            return self._advance(available // self.engine.hop_length + 1 if available >= 0 else 0)
+
+    def flush(self) -> int:
+        """Fin du flux : dernières trames, avec le padding de fin du batch"""
+        with self.lock:
+            if self.zero_tail is None or self.finished:
+                return 0
+            self.finished = True
+            self.zero_tail = np.concatenate([self.zero_tail, np.zeros(self.pad, dtype=np.float32)])
+            self.edge_tail = np.concatenate([self.edge_tail, np.full(self.pad, self.edge_tail[-1])])
+            return self._advance(self.engine.n_frames(self.samples))
+
+    def _advance(self, total: int) -> int:
+        """Calcule les trames [self.frames, total) (seules les capacity dernières sont gardées)"""
+        engine = self.engine
+        hop, n_fft = engine.hop_length, engine.n_fft
+        count = total - self.frames
+        if count <= 0:
+            return 0
+        first = max(self.frames, total - self.capacity)
+        start = first * hop - self.offset
+        stop = (total - 1) * hop - self.offset + n_fft
+
+        block = librosa.util.frame(self.zero_tail[start:stop], frame_length=n_fft, hop_length=hop)
+        S, rms = engine.frame_spectrum(block)
+        S = S.astype(np.float32)
+        slots = np.arange(first, total) % self.capacity
+        self.S[:, slots] = S
+        self.rms[slots] = rms
+        self.zcr[slots] = engine.zero_crossings(self.edge_tail[start:stop], np.arange(total - first) * hop)
+
+        # Pics de pitch regroupés par trame
+        pitch, mag = librosa.piptrack(S=S, sr=self.sr, n_fft=n_fft)
+        mask = (pitch > 0).T
+        bounds = np.cumsum(mask.sum(axis=1))[:-1]
+        for slot, p, m in zip(slots, np.split(pitch.T[mask], bounds), np.split(mag.T[mask], bounds)):
+            self.peaks[slot] = (p, m)
+
+        # Seule la partie utile aux trames suivantes est conservée
+        consumed = total * hop - self.offset
+        self.zero_tail = self.zero_tail[consumed:]
+        self.edge_tail = self.edge_tail[consumed:]
+        self.offset = total * hop
+        self.frames = total
+        self.new_frames += count
+        return count
+
+    def take_new_frames(self) -> int:
+        """Trames calculées depuis le dernier appel"""
+        with self.lock:
+            count, self.new_frames = self.new_frames, 0
+            return count
+
+    def _slots(self):
+        n = min(self.frames, self.capacity)
+        return np.arange(self.frames - n, self.frames) % self.capacity
+
+    def levels(self):
+        """(rms, zcr) des trames conservées, dans l'ordre (VAD)"""
+        with self.lock:
+            slots = self._slots()
+            return self.rms[slots], self.zcr[slots]
+
+    def window(self, snr_db: float = None) -> np.ndarray:
+        """
+        Features (T, 54) des trames conservées (au plus capacity).
+        snr_db sous le seuil de débruitage : spectrogramme de la fenêtre
+        débruité et features recalculées (comme extract_features).
+        """
+        engine = self.engine
+        with self.lock:
+            slots = self._slots()
+            # Copie C-contiguë, comme le spectrogramme du batch (mêmes appels BLAS)
+            S, rms = np.ascontiguousarray(self.S[:, slots]), self.rms[slots]
+            if snr_db is not None and snr_db < spectral_gate.snr_threshold_db:
+                S, rms = spectral_gate.apply(S, rms, sr=self.sr, snr_db=snr_db)
+                return engine.assemble(engine.mfcc(S, self.sr), engine.chroma(S, self.sr), self.zcr[slots], rms)
+
+            # Accord à partir des pics déjà extraits (piptrack non recalculé)
+            peaks = [self.peaks[slot] for slot in slots]
+            empty = np.zeros(0, dtype=np.float32)
+            tuning = engine.tuning(
+                np.concatenate([p for p, _ in peaks]) if peaks else empty,
+                np.concatenate([m for _, m in peaks]) if peaks else empty,
+            )
+            chroma = engine.normalize_chroma(engine.chroma_projection(S, self.sr, tuning))
+            return engine.assemble(engine.mfcc(S, self.sr), chroma, self.zcr[slots], rms)
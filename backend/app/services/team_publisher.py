@@ -0,0 +1,126 @@
+import asyncio
+import json
+import time
+
+from app.config import settings
+
+
+class TeamPublisher:
+    """
+    Publication groupée des mises à jour d'émotion par équipe. Les mises à
+    jour reçues pendant un tick sont regroupées (la dernière par appel) en
+    un seul message emotion_updates par équipe, sérialisé une fois et remis
+    tel quel à chaque superviseur de l'équipe.
+    Un appel n'est pas republié avant call_min_interval_ms : sa dernière
+    mise à jour attend un tick suivant.
+    Un superviseur en retard garde au plus un lot en attente par équipe
+    (clé ("emotion_updates", team_id)) : le lot suivant y est fusionné,
+    dernière mise à jour par appel, sans perdre l'état d'aucun appel.
+    """
+
+    def __init__(self, tick_ms: float, call_min_interval_ms: float):
+        self.tick = tick_ms / 1000
+        self.call_min_interval = call_min_interval_ms / 1000
+        self.pending = {}  # team_id -> {call_id: mise à jour}
+        self.last_published = {}  # call_id -> instant de la dernière publication
+        self.deliver = None
+        self.worker = None
+
+        self.messages = 0
+        self.updates = 0
+        self.replaced = 0
+
+    async def start(self, deliver):
+        """deliver(team_id, message JSON, clé de file, fusion) : remise aux connexions de l'équipe"""
+        if self.worker is not None:
+            return
+        self.deliver = deliver
+        self.worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.worker is None:
+            return
+        self.worker.cancel()
+        try:
+            await self.worker
+        except asyncio.CancelledError:
+            pass
+        self.worker = None
+
+    def publish(self, team_id: str, call_id: str, update: dict):
+        """Met à jour l'état à publier pour l'appel (remplace le précédent non publié)"""
+        team = self.pending.setdefault(team_id, {})
+        if call_id in team:
+            self.replaced += 1
+        team[call_id] = update
+
+    def forget(self, call_id: str, team_id: str = None):
+        """Appel terminé : sa mise à jour en attente n'est pas publiée"""
+        self.last_published.pop(call_id, None)
+        teams = [team_id] if team_id is not None else list(self.pending)
+        for team in teams:
+            updates = self.pending.get(team)
+            if updates is not None:
+                updates.pop(call_id, None)
+                if not updates:
+                    del self.pending[team]
+
+    def flush(self):
+        """Publie, par équipe, les mises à jour des appels non limités par le débit"""
+        now = time.monotonic()
+        for team_id, updates in list(self.pending.items()):
+            ready = [
+                call_id for call_id in updates
+                if now - self.last_published.get(call_id, float("-inf")) >= self.call_min_interval
+            ]
+            if not ready:
+                continue
+            batch = [updates.pop(call_id) for call_id in ready]
+            for call_id in ready:
+                self.last_published[call_id] = now
+            if not updates:
+                del self.pending[team_id]
+
+            message = json.dumps({"type": "emotion_updates", "data": {"updates": batch}})
+            self.messages += 1
+            self.updates += len(batch)
+            if self.deliver is not None:
+                self.deliver(team_id, message, ("emotion_updates", team_id), self.merge)
+
+    def merge(self, pending: str, message: str) -> str:
+        """
+        Fusion d'un lot non envoyé et du suivant (dernière mise à jour par
+        appel). Le lot fusionné passe après les messages mis en file entre
+        les deux : les appels terminés depuis (call_ended déjà en file) en
+        sont retirés.
+        """
+        updates = {
+            update["call_id"]: update for update in json.loads(pending)["data"]["updates"]
+            if update["call_id"] in self.last_published
+        }
+        for update in json.loads(message)["data"]["updates"]:
+            updates[update["call_id"]] = update
+        return json.dumps({"type": "emotion_updates", "data": {"updates": list(updates.values())}})
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[Publisher] Erreur publication: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "messages": self.messages,
+            "updates": self.updates,
+            "replaced": self.replaced,
+            "pending_calls": sum(len(updates) for updates in self.pending.values()),
+        }
+
+
+# Instance globale
+team_publisher = TeamPublisher(
+    tick_ms=settings.ws_publish_tick_ms,
+    call_min_interval_ms=settings.ws_call_min_interval_ms,
+)
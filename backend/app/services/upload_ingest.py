@@ -0,0 +1,219 @@
+import hashlib
+import os
+import re
+import uuid
+
+import aiofiles
+from fastapi import HTTPException, Request, status
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from app.config import settings
+
+
+# Schéma OpenAPI du corps multipart (le corps est lu en streaming, pas via UploadFile)
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"],
+                }
+            }
+        },
+    }
+}
+
+
+class IngestedUpload:
+    """
+    Fichier reçu, avec son sha256 et sa taille. Les petits fichiers restent en
+    mémoire (data) ; au-delà de memory_max_bytes ils sont écrits au fil de
+    l'eau dans un fichier de spool unique (path).
+    """
+
+    def __init__(self, filename: str, path: str, memory_max_bytes: int):
+        self.filename = filename
+        self.path = path
+        self.memory_max_bytes = memory_max_bytes
+        self.data = None
+        self.size = 0
+        self.digest = hashlib.sha256()
+        self.pending = []  # octets reçus pas encore écrits
+        self.file = None
+        self.complete = False
+
+    @property
+    def sha256(self) -> str:
+        return self.digest.hexdigest()
+
+    @property
+    def source(self):
+        """Octets en mémoire ou chemin du fichier de spool (accepté par decode_audio)"""
+        return self.data if self.data is not None else self.path
+
+    async def flush(self):
+        if self.file is None and self.size <= self.memory_max_bytes:
+            if self.complete:
+                self.data = b"".join(self.pending)
+                self.pending = []
+            return
+        if self.file is None:
+            self.file = await aiofiles.open(self.path, "wb")
+        if self.pending:
+            data = b"".join(self.pending)
+            self.pending = []
+            await self.file.write(data)
+        if self.complete:
+            await self.file.close()
+
+    async def cleanup(self):
+        self.data = None
+        self.pending = []
+        if self.file is None:
+            return
+        if not self.file.closed:
+            await self.file.close()
+        if os.path.exists(self.path):
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+def _spool_path(filename: str) -> str:
+    """Chemin unique dans upload_dir (l'extension d'origine aide le décodeur)"""
+    ext = os.path.splitext(filename or "")[1].lower()
+    if not re.fullmatch(r"\.[a-z0-9]{1,5}", ext):
+        ext = ""
+    return os.path.join(settings.upload_dir, f"{uuid.uuid4().hex}{ext}")
+
+
+def _too_large(max_bytes):
+    return HTTPException(
+        status_code=413,
+        detail=f"Fichier trop volumineux (max {max_bytes // (1024 * 1024)} Mo)",
+    )
+
+
+def check_multipart(request: Request):
+    """400 si le corps n'est pas un formulaire multipart ; retourne la boundary"""
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Corps multipart/form-data attendu")
+    return params[b"boundary"]
+
+
+async def iter_uploads(request: Request, max_bytes: int = None):
+    """
+    Lit le corps multipart au fil de l'eau et produit chaque fichier dès qu'il
+    est complet. La limite de taille est vérifiée pendant la réception, le
+    sha256 est calculé dans la même passe et l'écriture disque (fichiers au-delà
+    de upload_memory_max_mb) est asynchrone.
+    L'appelant est responsable de upload.cleanup() pour chaque fichier produit.
+    """
+    max_bytes = max_bytes or settings.max_audio_size_mb * 1024 * 1024
+    memory_max_bytes = settings.upload_memory_max_mb * 1024 * 1024
+    boundary = check_multipart(request)
+
+    os.makedirs(settings.upload_dir, exist_ok=True)
+    uploads = []  # fichiers en cours de réception
+    state = {"part": None, "header_field": b"", "header_value": b"", "headers": {}, "too_large": False}
+
+    def on_part_begin():
+        state["part"] = None
+        state["headers"] = {}
+
+    def on_header_field(data, start, end):
+        state["header_field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["header_value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["header_field"].lower()] = state["header_value"]
+        state["header_field"] = b""
+        state["header_value"] = b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        if b"filename" in options:
+            filename = options[b"filename"].decode("utf-8", "replace")
+            state["part"] = IngestedUpload(filename, _spool_path(filename), memory_max_bytes)
+            uploads.append(state["part"])
+
+    def on_part_data(data, start, end):
+        part = state["part"]
+        if part is None:
+            return  # champ de formulaire simple : ignoré
+        chunk = data[start:end]
+        part.size += len(chunk)
+        if part.size > max_bytes:
+            state["too_large"] = True
+            return
+        part.digest.update(chunk)
+        part.pending.append(chunk)
+
+    def on_part_end():
+        if state["part"] is not None:
+            state["part"].complete = True
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if state["too_large"]:
+                raise _too_large(max_bytes)
+            for upload in list(uploads):
+                await upload.flush()
+                if upload.complete:
+                    uploads.remove(upload)
+                    yield upload
+        parser.finalize()
+    finally:
+        # Fichiers partiels (erreur, client déconnecté ou générateur abandonné)
+        for upload in uploads:
+            await upload.cleanup()
+
+
+def check_content_length(request: Request, max_bytes: int):
+    """Refus immédiat (413), avant de lire le corps, si la taille annoncée dépasse la limite"""
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_bytes + 64 * 1024:
+        raise _too_large(max_bytes)
+
+
+async def receive_upload(request: Request, max_bytes: int = None) -> IngestedUpload:
+    """Premier fichier du formulaire (les éventuels fichiers suivants sont ignorés)"""
+    max_bytes = max_bytes or settings.max_audio_size_mb * 1024 * 1024
+    check_content_length(request, max_bytes)
+
+    received = None
+    try:
+        async for upload in iter_uploads(request, max_bytes):
+            if received is None:
+                received = upload
+            else:
+                await upload.cleanup()
+    except BaseException:
+        if received is not None:
+            await received.cleanup()
+        raise
+    if received is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Aucun fichier reçu")
+    return received
@@ -0,0 +1,98 @@
+import numpy as np
+
+from app.config import settings
+from app.services.feature_engine import feature_engine, N_FFT, HOP_LENGTH, SAMPLE_RATE
+
+
+def _runs(active) -> np.ndarray:
+    """Plages [début, fin) des suites de True d'un masque booléen, forme (N, 2)"""
+    edges = np.diff(np.concatenate(([0], active.astype(np.int8), [0])))
+    return np.stack([np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)], axis=1)
+
+
+def segment_frames(segments) -> np.ndarray:
+    """Indices des trames couvertes par les segments, dans l'ordre"""
+    segments = np.asarray(segments, dtype=np.int64).reshape(-1, 2)
+    if not len(segments):
+        return np.zeros(0, dtype=np.int64)
+    lengths = segments[:, 1] - segments[:, 0]
+    # Pour chaque trame : début de son segment + position dans le segment
+    offsets = np.repeat(segments[:, 0] - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+    return np.arange(lengths.sum()) + offsets
+
+
+class VoiceActivityDetector:
+    """
+    Détection de parole par énergie + ZCR, sur la grille de trames des
+    features (n_fft / hop_length, centrée) : les segments renvoyés sont
+    directement des plages de trames de l'enregistrement d'origine.
+    """
+
+    def __init__(self, energy_margin_db: float, min_energy_db: float, max_zcr: float,
+                 min_speech_ms: float, hangover_ms: float,
+                 n_fft=N_FFT, hop_length=HOP_LENGTH):
+        self.energy_margin_db = energy_margin_db
+        self.min_energy_db = min_energy_db
+        self.max_zcr = max_zcr
+        self.min_speech_ms = min_speech_ms
+        self.hangover_ms = hangover_ms
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+
+    def frame_rms(self, y) -> np.ndarray:
+        """RMS par trame via somme cumulée des carrés (même valeur que la feature RMS)"""
+        pad = self.n_fft // 2
+        energy = np.concatenate(([0.0], np.cumsum(np.square(np.pad(y, (pad, pad)), dtype=np.float64))))
+        starts = np.arange(1 + len(y) // self.hop_length) * self.hop_length
+        return np.sqrt(np.maximum(energy[starts + self.n_fft] - energy[starts], 0) / self.n_fft)
+
+    def _ms_to_frames(self, ms, sr):
+        return int(round(ms / 1000 * sr / self.hop_length))
+
+    def detect(self, y, sr=SAMPLE_RATE):
+        """
+        Retourne (segments (N, 2) en trames [début, fin), SNR estimé en dB ou None).
+        Seuil d'énergie adaptatif : au-dessus du plancher de bruit (10e percentile)
+        sans s'éloigner de plus de energy_margin_db du niveau fort (90e percentile).
+        """
+        return self.classify(self.frame_rms(y), feature_engine.zero_crossing_rate(y), sr)
+
+    def classify(self, rms, zcr, sr=SAMPLE_RATE):
+        """detect() à partir du RMS et du ZCR par trame déjà calculés (flux temps réel)"""
+        rms = np.asarray(rms, dtype=np.float64)
+        db = 20 * np.log10(np.maximum(rms, 1e-10))
+        floor, loud = np.percentile(db, [10, 90])
+        threshold = max(self.min_energy_db, min(floor + self.energy_margin_db, loud - self.energy_margin_db))
+        active = (db > threshold) & (zcr < self.max_zcr)
+
+        n_frames = len(rms)
+        hangover = self._ms_to_frames(self.hangover_ms, sr)
+        segments = _runs(active)
+        if len(segments):
+            # Marge autour de chaque région, puis fusion des régions qui se touchent
+            segments[:, 0] = np.maximum(segments[:, 0] - hangover, 0)
+            segments[:, 1] = np.minimum(segments[:, 1] + hangover, n_frames)
+            covered = np.zeros(n_frames, dtype=bool)
+            covered[segment_frames(segments)] = True
+            segments = _runs(covered)
+            # Suppression des régions trop courtes (clics, bruits isolés)
+            min_frames = self._ms_to_frames(self.min_speech_ms, sr) + 2 * hangover
+            segments = segments[segments[:, 1] - segments[:, 0] >= min_frames]
+
+        speech = np.zeros(n_frames, dtype=bool)
+        speech[segment_frames(segments)] = True
+        snr_db = None
+        if speech.any() and not speech.all():
+            signal = np.mean(np.square(rms[speech]))
+            noise = max(np.mean(np.square(rms[~speech])), signal * 1e-10)
+            snr_db = float(10 * np.log10(signal / noise))
+        return segments, snr_db
+
+
+voice_activity = VoiceActivityDetector(
+    energy_margin_db=settings.vad_energy_margin_db,
+    min_energy_db=settings.vad_min_energy_db,
+    max_zcr=settings.vad_max_zcr,
+    min_speech_ms=settings.vad_min_speech_ms,
+    hangover_ms=settings.vad_hangover_ms,
+)
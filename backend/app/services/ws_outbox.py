@@ -0,0 +1,113 @@
+import asyncio
+import itertools
+from collections import OrderedDict
+
+from fastapi import WebSocket
+
+
+class OutboxStats:
+    """Compteurs globaux des files sortantes WebSocket"""
+
+    def __init__(self):
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.evicted = 0
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "evicted": self.evicted,
+        }
+
+
+outbox_stats = OutboxStats()
+
+
+class Outbox:
+    """
+    File sortante bornée d'un WebSocket, vidée par sa propre tâche d'envoi :
+    un client lent ne ralentit ni les autres ni l'émetteur.
+    Les messages avec une clé (ex. emotion_feedback d'un agent) remplacent le
+    message en attente de même clé, ou y sont fusionnés (merge, ex. lots
+    emotion_updates d'une équipe : le message fusionné passe en fin de file). File pleine : le plus ancien message à
+    clé est abandonné ; s'il n'y en a aucun, ou si un envoi échoue ou dépasse
+    send_timeout_s, la connexion est évincée (on_close puis fermeture).
+    """
+
+    def __init__(self, websocket: WebSocket, max_size: int, send_timeout_s: float, on_close=None):
+        self.websocket = websocket
+        self.max_size = max_size
+        self.send_timeout = send_timeout_s
+        self.on_close = on_close
+        self.pending = OrderedDict()  # clé -> message JSON sérialisé
+        self.ids = itertools.count()  # clés des messages sans coalescence
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.task = asyncio.create_task(self._run())
+
+    def put(self, payload: str, key=None, merge=None):
+        """
+        Met un message en file sans attendre (key : clé de coalescence ;
+        merge(en attente, nouveau) -> message fusionné, au lieu du remplacement)
+        """
+        if self.closed:
+            return
+        if key is not None and key in self.pending:
+            if merge is not None:
+                self.pending[key] = merge(self.pending[key], payload)
+                self.pending.move_to_end(key)
+            else:
+                self.pending[key] = payload
+            outbox_stats.coalesced += 1
+            return
+        if len(self.pending) >= self.max_size and not self._drop_oldest_keyed():
+            self.close("file sortante pleine")
+            return
+        self.pending[key if key is not None else next(self.ids)] = payload
+        self.ready.set()
+
+    def _drop_oldest_keyed(self) -> bool:
+        for key in self.pending:
+            if isinstance(key, tuple):
+                del self.pending[key]
+                outbox_stats.dropped += 1
+                return True
+        return False
+
+    async def _run(self):
+        try:
+            while True:
+                if not self.pending:
+                    self.ready.clear()
+                    await self.ready.wait()
+                    continue
+                _, payload = self.pending.popitem(last=False)
+                await asyncio.wait_for(self.websocket.send_text(payload), timeout=self.send_timeout)
+                outbox_stats.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.close(f"envoi impossible ({type(e).__name__})")
+
+    def close(self, reason: str = None):
+        """Arrête l'envoi ; reason : éviction (la connexion est aussi fermée)"""
+        if self.closed:
+            return
+        self.closed = True
+        self.pending.clear()
+        self.task.cancel()
+        if reason is not None:
+            outbox_stats.evicted += 1
+            print(f"[WS] Connexion évincée : {reason}")
+            asyncio.create_task(self._close_socket())
+        if self.on_close is not None:
+            self.on_close(self)
+
+    async def _close_socket(self):
+        try:
+            await asyncio.wait_for(self.websocket.close(code=1013), timeout=self.send_timeout)
+        except Exception:
+            pass